@@ -0,0 +1,70 @@
+"""Compare the mask-based filter with the (Country, Year) index.
+
+Run from the repository root:
+
+    python -m benchmarks.filter_benchmark [rows ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_index import CountryYearIndex, select_rows
+from utils.data_loader import NUMERIC_COLUMNS, compact_dtypes, get_dataset_version
+from utils.frame_registry import register_frame
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+COUNTRIES = 50
+YEARS = range(1990, 2024)
+REPEATS = 5
+
+
+def make_dataset(rows, seed=0):
+    """Synthetic table with digi.csv's schema, rows shuffled"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Country": pd.Categorical.from_codes(rng.integers(0, COUNTRIES, rows),
+                                             [f"Country {i}" for i in range(COUNTRIES)]),
+        "Year": rng.integers(YEARS.start, YEARS.stop, rows).astype(np.int16),
+    })
+    for col in NUMERIC_COLUMNS:
+        df[col] = rng.normal(100, 20, rows)
+    df = compact_dtypes(df)
+    register_frame(df, dataset_version=get_dataset_version(df))
+    return df
+
+
+def mask_filter(df, countries, years):
+    """The previous filter_data path: copy, then boolean masks"""
+    filtered_df = df.copy()
+    filtered_df = filtered_df[filtered_df["Country"].isin(countries)]
+    return filtered_df[(filtered_df["Year"] >= years[0]) & (filtered_df["Year"] <= years[1])]
+
+
+def best_time(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(sizes):
+    countries = ["Country 3", "Country 17", "Country 42"]
+    years = (2000, 2009)
+    print(f"{'rows':>12} {'index build':>12} {'mask':>10} {'index':>10} {'speedup':>8} {'selected':>10}")
+    for rows in sizes:
+        df = make_dataset(rows)
+        build, _ = best_time(lambda: CountryYearIndex(df))
+        select_rows(df, countries, years)  # build the shared index once
+        masked_time, masked = best_time(lambda: mask_filter(df, countries, years))
+        indexed_time, indexed = best_time(lambda: select_rows(df, countries, years))
+        pd.testing.assert_frame_equal(masked, indexed)
+        print(f"{rows:>12,} {build * 1000:>10.1f}ms {masked_time * 1000:>8.2f}ms {indexed_time * 1000:>8.2f}ms "
+              f"{masked_time / indexed_time:>7.1f}x {len(indexed):>10,}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
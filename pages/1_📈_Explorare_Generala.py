@@ -8,6 +8,8 @@ import os
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.data_loader import load_data, get_column_info, get_country_colors
+from utils.data_index import select_rows
+from utils.aggregate_cube import get_aggregate_cube
 
 st.set_page_config(page_title="Explorare Generală", page_icon="📈", layout="wide")
 
@@ -18,6 +20,8 @@ st.markdown("Vizualizări și statistici generale despre dataset-ul economic")
 df = load_data()
 column_info = get_column_info()
 colors = get_country_colors()
+# Per-(country, year) aggregates, rebuilt when the dataset version changes
+cube = get_aggregate_cube(df)
 
 # Sidebar filters
 st.sidebar.header("🔍 Filtre")
@@ -33,13 +37,12 @@ year_range = st.sidebar.slider(
     max_value=int(df['Year'].max()),
     value=(int(df['Year'].min()), int(df['Year'].max()))
 )
+if "memory_footprint" in df.attrs:
+    before, after = df.attrs["memory_footprint"]
+    st.sidebar.caption(f"Memorie date: {after / 1024:,.0f} KB (față de {before / 1024:,.0f} KB cu tipurile din CSV)")
 
-# Filter data
-filtered_df = df[
-    (df['Country'].isin(selected_countries)) &
-    (df['Year'] >= year_range[0]) &
-    (df['Year'] <= year_range[1])
-]
+# Filter data (binary search on the dataset's sorted (Country, Year) index)
+filtered_df = select_rows(df, countries=selected_countries, years=year_range)
 
 # Overview metrics
 st.header("📊 Statistici Generale")
@@ -114,7 +117,7 @@ with tab1:
     
     # Show statistics
     st.subheader(f"Statistici {indicator}")
-    stats_df = filtered_df.groupby('Country')[indicator].agg(['mean', 'min', 'max', 'std']).round(2)
+    stats_df = cube.stats(indicator, selected_countries, year_range)[['mean', 'min', 'max', 'std']].round(2)
     stats_df.columns = ['Media', 'Minim', 'Maxim', 'Deviație Standard']
     st.dataframe(stats_df, use_container_width=True)
 
@@ -127,7 +130,7 @@ with tab2:
         value=int(filtered_df['Year'].max())
     )
     
-    comparison_data = filtered_df[filtered_df['Year'] == year_to_compare]
+    comparison_data = cube.year_values(year_to_compare, selected_countries)
     
     # Create subplots for all indicators
     indicators = ['GDP', 'FDI', 'IU', 'MCS', 'PA', 'EF']
@@ -201,7 +204,16 @@ selected_indicator = st.selectbox(
     key="stats_indicator"
 )
 
-stats_by_country = filtered_df.groupby('Country')[selected_indicator].describe().round(2)
+# Count, mean, std and extremes come from the cube; only the quartiles need the rows
+cube_stats = cube.stats(selected_indicator, selected_countries, year_range)
+quartiles = (
+    filtered_df.groupby('Country', observed=True)[selected_indicator]
+    .quantile([0.25, 0.5, 0.75]).unstack()
+    .reindex(cube_stats.index)
+)
+stats_by_country = pd.concat(
+    [cube_stats[['count', 'mean', 'std', 'min']], quartiles, cube_stats[['max']]], axis=1
+).round(2)
 stats_by_country.columns = ['Count', 'Media', 'Dev. Std', 'Min', '25%', '50% (Mediană)', '75%', 'Max']
 
 st.dataframe(stats_by_country, use_container_width=True)
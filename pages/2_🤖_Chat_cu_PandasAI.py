@@ -2,11 +2,16 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
+import time
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.data_loader import load_data, get_column_info
-from utils.config import get_agent
+from utils.data_loader import load_agent_data, get_column_info
+from utils.agent_runner import run_query
+from utils.responses import figure_png, to_plotly_figure
+from utils.agent_pool import get_session_agent
+from utils.config import get_agent_llm
+from utils.chart_store import get_chart_store
 from utils.auth import require_api_key, get_selected_model
 
 st.set_page_config(page_title="Chat cu PandasAI", page_icon="🤖", layout="wide")
@@ -18,16 +23,16 @@ st.markdown("Pune întrebări în limbaj natural despre datele economice")
 api_key = require_api_key()
 
 # Load data
-df = load_data()
+df = load_agent_data()
 column_info = get_column_info()
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-if "agent" not in st.session_state:
-    with st.spinner("Inițializez PandasAI Agent..."):
-        st.session_state.agent = get_agent(df, api_key, get_selected_model())
+# Conversation agent from the shared pool; the LLM client and dataframe
+# are shared with other sessions, only the conversation memory is ours
+agent = get_session_agent("chat", df, api_key, get_selected_model(), hedging=True)
 
 # Display dataset info
 with st.expander("📊 Informații despre Dataset"):
@@ -73,14 +78,40 @@ st.markdown("---")
 # Chat interface
 st.subheader("💬 Conversație")
 
+def show_full_chart(chart_id, idx):
+    """The full-size chart, sent to the browser only after the button is pressed"""
+    key = f"chat_full_chart_{idx}"
+    if st.session_state.get(key):
+        st.image(get_chart_store().get(chart_id) or get_chart_store().get(chart_id, thumbnail=True))
+        st.button("🔽 Ascunde graficul mărit", key=f"{key}_hide",
+                  on_click=lambda: st.session_state.update({key: False}))
+    else:
+        st.button("🔍 Mărește graficul", key=f"{key}_show",
+                  on_click=lambda: st.session_state.update({key: True}))
+
+
 # Display chat history
-for message in st.session_state.messages:
+for idx, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if "image" in message and message["image"]:
-            # Check if image still exists before displaying
-            if os.path.exists(message["image"]):
-                st.image(message["image"])
+        if message.get("figure") is not None:
+            st.plotly_chart(to_plotly_figure(message["figure"]), use_container_width=True,
+                            key=f"chat_figure_{idx}")
+            png = figure_png(message["figure"])
+            if png is None:
+                st.caption("🖼️ Imaginea PNG pentru export se pregătește...")
+            elif png:
+                st.download_button("📥 Descarcă PNG", png, file_name="grafic.png", mime="image/png",
+                                   key=f"chat_png_{idx}")
+        if message.get("image"):
+            # History shows the small thumbnail; the full chart loads on demand
+            thumbnail = get_chart_store().get(message["image"], thumbnail=True)
+            if thumbnail is None:
+                st.caption("Graficul nu mai este disponibil.")
+            else:
+                st.image(thumbnail)
+                # A fragment, so the button only reruns this chart
+                st.fragment(show_full_chart)(message["image"], idx)
 
 # Chat input
 if prompt := st.chat_input("Pune o întrebare despre date...") or st.session_state.get("current_query"):
@@ -97,58 +128,70 @@ if prompt := st.chat_input("Pune o întrebare despre date...") or st.session_sta
     
     # Get response from PandasAI
     with st.chat_message("assistant"):
-        with st.spinner("Analizez întrebarea..."):
+        # Stream the model output while PandasAI is still working, so the user
+        # sees progress within the first second instead of a blank spinner
+        stream_placeholder = st.empty()
+        stream_placeholder.caption("Analizez întrebarea...")
+        streamed_tokens = []
+        last_render = [0.0]
+        
+        def show_tokens(token):
+            streamed_tokens.append(token)
+            now = time.monotonic()
+            if now - last_render[0] >= 0.05:
+                # The model streams the Python code it is writing (without its
+                # markdown fences, which the code block replaces)
+                code = "".join(streamed_tokens).replace("```python", "").replace("```", "")
+                stream_placeholder.code(code.strip("\n") + "▌", language="python")
+                last_render[0] = now
+        
+        def restart_tokens():
+            # A retry starts the answer over; drop the failed attempt's code
+            if streamed_tokens:
+                streamed_tokens.clear()
+                stream_placeholder.caption("Reîncerc...")
+        
+        with get_agent_llm(agent).streaming(show_tokens, on_restart=restart_tokens):
             try:
-                # Delete old chart before processing new question
-                chart_path = "exports/charts/temp_chart.png"
-                if os.path.exists(chart_path):
-                    try:
-                        os.remove(chart_path)
-                    except:
-                        pass
+                response = run_query(agent, prompt, df)
+                value = response.value
                 
-                response = st.session_state.agent.chat(prompt)
+                # Replace the raw streamed output with the final answer
+                stream_placeholder.empty()
                 
                 # Display response
-                if isinstance(response, str):
-                    st.markdown(response)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response,
-                        "image": None
-                    })
-                elif isinstance(response, (pd.DataFrame, pd.Series)):
-                    st.dataframe(response, use_container_width=True)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": f"Iată rezultatul:\n\n{response.to_string()}",
-                        "image": None
-                    })
+                if isinstance(value, str):
+                    st.markdown(value)
+                    content = value
+                elif isinstance(value, (pd.DataFrame, pd.Series)):
+                    st.dataframe(value, use_container_width=True)
+                    content = f"Iată rezultatul:\n\n{value.to_string()}"
+                elif value is not None:
+                    st.write(str(value))
+                    content = str(value)
                 else:
-                    st.write(str(response))
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": str(response),
-                        "image": None
-                    })
+                    content = "Iată graficul:"
                 
-                # Check for newly generated charts and save a copy
-                if os.path.exists(chart_path):
-                    st.image(chart_path)
-                    # Save a copy of the chart with unique name for history
-                    import time
-                    unique_chart_path = f"exports/charts/chart_{int(time.time() * 1000)}.png"
-                    try:
-                        import shutil
-                        shutil.copy2(chart_path, unique_chart_path)
-                        # Update last message with unique image path
-                        if st.session_state.messages:
-                            st.session_state.messages[-1]["image"] = unique_chart_path
-                    except Exception as e:
-                        # If copy fails, don't save image reference
-                        pass
+                # The chart arrives in memory with the response; the history
+                # only keeps its id in the shared chart store
+                chart_id = None
+                if response.figure is not None:
+                    st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                    # Start the PNG export now so it is ready when the history shows it
+                    figure_png(response.figure)
+                if response.chart:
+                    st.image(response.chart)
+                    chart_id = get_chart_store().put(response.chart)
+                    get_chart_store().acquire(chart_id)
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": content,
+                    "image": chart_id,
+                    "figure": response.figure
+                })
             
             except Exception as e:
+                stream_placeholder.empty()
                 error_msg = f"❌ Eroare la procesarea întrebării: {str(e)}"
                 st.error(error_msg)
                 st.info("Încearcă să reformulezi întrebarea sau verifică API Key-ul.")
@@ -158,9 +201,20 @@ if prompt := st.chat_input("Pune o întrebare despre date...") or st.session_sta
                     "image": None
                 })
 
+# Prompt sizes the provider reported for this key and model's recent requests
+prompt_stats = get_agent_llm(agent).prompt_token_stats()
+if prompt_stats is not None:
+    st.caption(
+        f"Dimensiune prompt: ultima cerere {prompt_stats['last']:,} tokeni · medie {prompt_stats['avg']:,.0f} · "
+        f"maxim {prompt_stats['max']:,} (ultimele {prompt_stats['calls']} cereri)"
+    )
+
 # Clear chat button
 if st.session_state.messages:
     if st.button("🗑️ Șterge Conversația", type="secondary"):
+        for message in st.session_state.messages:
+            if message.get("image"):
+                get_chart_store().release(message["image"])
         st.session_state.messages = []
         st.rerun()
 
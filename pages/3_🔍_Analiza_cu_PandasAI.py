@@ -2,12 +2,17 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
+import time
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.data_loader import load_data, get_column_info
-from utils.config import get_agent
+from utils.data_loader import load_agent_data, get_column_info
+from utils.agent_runner import run_query
+from utils.responses import figure_png, to_plotly_figure
+from utils.agent_pool import get_agent_pool, get_session_agent
 from utils.auth import require_api_key, get_selected_model
+from utils.job_queue import DONE, FAILED, QUEUED, RUNNING, get_job_queue, get_owner_id
+from utils.scheduler import get_session_id, scheduled_as
 
 st.set_page_config(page_title="Analiză cu PandasAI", page_icon="🔍", layout="wide")
 
@@ -18,13 +23,13 @@ st.markdown("Demonstrează capacitățile avansate ale PandasAI pentru analiză
 api_key = require_api_key()
 
 # Load data
-df = load_data()
+df = load_agent_data()
 column_info = get_column_info()
 
-# Initialize agent
-if "agent_advanced" not in st.session_state:
-    with st.spinner("Inițializez PandasAI Agent..."):
-        st.session_state.agent_advanced = get_agent(df, api_key, get_selected_model())
+# Conversation agent from the shared pool; the LLM client and dataframe
+# are shared with other sessions, only the conversation memory is ours
+agent_advanced = get_session_agent("advanced", df, api_key, get_selected_model())
+owner_id = get_owner_id(api_key)
 
 # Analysis categories
 st.header("📊 Categorii de Analiză")
@@ -73,27 +78,21 @@ if analysis_category == "Statistici Descriptive":
             if selected_query:
                 with st.spinner("PandasAI analizează datele..."):
                     try:
-                        # Delete old chart before processing
-                        chart_path = "exports/charts/temp_chart.png"
-                        if os.path.exists(chart_path):
-                            try:
-                                os.remove(chart_path)
-                            except:
-                                pass
-                        
-                        response = st.session_state.agent_advanced.chat(selected_query)
+                        response = run_query(agent_advanced, selected_query, df)
                         
                         st.subheader("📊 Rezultat:")
-                        if isinstance(response, str):
-                            st.write(response)
-                        elif isinstance(response, (pd.DataFrame, pd.Series)):
-                            st.dataframe(response, use_container_width=True)
-                        else:
-                            st.write(str(response))
+                        if isinstance(response.value, str):
+                            st.write(response.value)
+                        elif isinstance(response.value, (pd.DataFrame, pd.Series)):
+                            st.dataframe(response.value, use_container_width=True)
+                        elif response.value is not None:
+                            st.write(str(response.value))
                         
-                        # Check for newly generated charts
-                        if os.path.exists(chart_path):
-                            st.image(chart_path)
+                        # The chart drawn for this query, captured in memory
+                        if response.figure is not None:
+                            st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                        if response.chart:
+                            st.image(response.chart)
                     
                     except Exception as e:
                         st.error(f"Eroare: {str(e)}")
@@ -131,27 +130,21 @@ elif analysis_category == "Corelații și Relații":
         if query:
             with st.spinner("PandasAI analizează corelațiile..."):
                 try:
-                    # Delete old chart before processing
-                    chart_path = "exports/charts/temp_chart.png"
-                    if os.path.exists(chart_path):
-                        try:
-                            os.remove(chart_path)
-                        except:
-                            pass
-                    
-                    response = st.session_state.agent_advanced.chat(query)
+                    response = run_query(agent_advanced, query, df)
                     
                     st.subheader("📊 Rezultat:")
-                    if isinstance(response, str):
-                        st.write(response)
-                    elif isinstance(response, (pd.DataFrame, pd.Series)):
-                        st.dataframe(response, use_container_width=True)
-                    else:
-                        st.write(str(response))
+                    if isinstance(response.value, str):
+                        st.write(response.value)
+                    elif isinstance(response.value, (pd.DataFrame, pd.Series)):
+                        st.dataframe(response.value, use_container_width=True)
+                    elif response.value is not None:
+                        st.write(str(response.value))
                     
-                    # Check for newly generated charts
-                    if os.path.exists(chart_path):
-                        st.image(chart_path)
+                    # The chart drawn for this query, captured in memory
+                    if response.figure is not None:
+                        st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                    if response.chart:
+                        st.image(response.chart)
                 
                 except Exception as e:
                     st.error(f"Eroare: {str(e)}")
@@ -189,27 +182,21 @@ elif analysis_category == "Analiză Comparativă":
         if query:
             with st.spinner("PandasAI efectuează comparația..."):
                 try:
-                    # Delete old chart before processing
-                    chart_path = "exports/charts/temp_chart.png"
-                    if os.path.exists(chart_path):
-                        try:
-                            os.remove(chart_path)
-                        except:
-                            pass
-                    
-                    response = st.session_state.agent_advanced.chat(query)
+                    response = run_query(agent_advanced, query, df)
                     
                     st.subheader("📊 Rezultat:")
-                    if isinstance(response, str):
-                        st.write(response)
-                    elif isinstance(response, (pd.DataFrame, pd.Series)):
-                        st.dataframe(response, use_container_width=True)
-                    else:
-                        st.write(str(response))
+                    if isinstance(response.value, str):
+                        st.write(response.value)
+                    elif isinstance(response.value, (pd.DataFrame, pd.Series)):
+                        st.dataframe(response.value, use_container_width=True)
+                    elif response.value is not None:
+                        st.write(str(response.value))
                     
-                    # Check for newly generated charts
-                    if os.path.exists(chart_path):
-                        st.image(chart_path)
+                    # The chart drawn for this query, captured in memory
+                    if response.figure is not None:
+                        st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                    if response.chart:
+                        st.image(response.chart)
                 
                 except Exception as e:
                     st.error(f"Eroare: {str(e)}")
@@ -247,27 +234,21 @@ elif analysis_category == "Predicții și Tendințe":
         if query:
             with st.spinner("PandasAI analizează tendințele..."):
                 try:
-                    # Delete old chart before processing
-                    chart_path = "exports/charts/temp_chart.png"
-                    if os.path.exists(chart_path):
-                        try:
-                            os.remove(chart_path)
-                        except:
-                            pass
-                    
-                    response = st.session_state.agent_advanced.chat(query)
+                    response = run_query(agent_advanced, query, df)
                     
                     st.subheader("📊 Rezultat:")
-                    if isinstance(response, str):
-                        st.write(response)
-                    elif isinstance(response, (pd.DataFrame, pd.Series)):
-                        st.dataframe(response, use_container_width=True)
-                    else:
-                        st.write(str(response))
+                    if isinstance(response.value, str):
+                        st.write(response.value)
+                    elif isinstance(response.value, (pd.DataFrame, pd.Series)):
+                        st.dataframe(response.value, use_container_width=True)
+                    elif response.value is not None:
+                        st.write(str(response.value))
                     
-                    # Check for newly generated charts
-                    if os.path.exists(chart_path):
-                        st.image(chart_path)
+                    # The chart drawn for this query, captured in memory
+                    if response.figure is not None:
+                        st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                    if response.chart:
+                        st.image(response.chart)
                 
                 except Exception as e:
                     st.error(f"Eroare: {str(e)}")
@@ -304,32 +285,70 @@ else:  # Analiză Complexă
     if st.button("🔍 Analizează Complex", type="primary"):
         query = custom_query if custom_query else selected_query
         if query:
-            with st.spinner("PandasAI efectuează analiza complexă... Acest lucru poate dura mai mult."):
-                try:
-                    # Delete old chart before processing
-                    chart_path = "exports/charts/temp_chart.png"
-                    if os.path.exists(chart_path):
-                        try:
-                            os.remove(chart_path)
-                        except:
-                            pass
-                    
-                    response = st.session_state.agent_advanced.chat(query)
-                    
-                    st.subheader("📊 Rezultat:")
+            # Complex analyses run in the background with their own agent, so the
+            # page stays usable and the result is kept if the user navigates away
+            model = get_selected_model()
+            session_id = get_session_id()
+
+            def run_job(query=query, model=model, session_id=session_id):
+                agent = get_agent_pool().create_agent(df, api_key, model)
+                with scheduled_as(session_id):
+                    return run_query(agent, query, df)
+
+            get_job_queue().submit(owner_id, query, run_job)
+            st.success("Analiza a fost pornită în fundal. Poți continua să lucrezi; rezultatul apare mai jos.")
+
+    st.markdown("---")
+    st.subheader("🗂️ Analizele Mele")
+
+    def show_jobs():
+        jobs = get_job_queue().list_jobs(owner_id)
+        if not jobs:
+            st.info("Nu ai pornit încă nicio analiză complexă.")
+            return
+
+        for job in jobs:
+            if job["status"] in (QUEUED, RUNNING):
+                elapsed = time.time() - (job["started_at"] or job["submitted_at"])
+                label = "⏳ În coadă" if job["status"] == QUEUED else f"⚙️ Rulează ({elapsed:.0f}s)"
+                st.markdown(f"**{label}** — {job['query']}")
+                continue
+
+            icon = "✅" if job["status"] == DONE else "❌"
+            finished = time.strftime("%H:%M:%S", time.localtime(job["finished_at"]))
+            with st.expander(f"{icon} {job['query']} ({finished})"):
+                if job["status"] == FAILED:
+                    st.error(f"Eroare: {job['error']}")
+                else:
+                    response = job["result"]
                     if isinstance(response, str):
                         st.write(response)
                     elif isinstance(response, (pd.DataFrame, pd.Series)):
                         st.dataframe(response, use_container_width=True)
-                    else:
+                    elif response is not None:
                         st.write(str(response))
-                    
-                    # Check for newly generated charts
-                    if os.path.exists(chart_path):
-                        st.image(chart_path)
-                
-                except Exception as e:
-                    st.error(f"Eroare: {str(e)}")
+                    if job["figure"] is not None:
+                        st.plotly_chart(to_plotly_figure(job["figure"]), use_container_width=True,
+                                        key=f"job_figure_{job['id']}")
+                        png = figure_png(job["figure"])
+                        if png is None:
+                            st.caption("🖼️ Imaginea PNG pentru export se pregătește...")
+                        elif png:
+                            st.download_button("📥 Descarcă PNG", png, file_name="grafic.png", mime="image/png",
+                                               key=f"job_png_{job['id']}")
+                    if job["chart"]:
+                        st.image(job["chart"])
+                if st.button("🗑️ Șterge", key=f"delete_{job['id']}"):
+                    get_job_queue().delete(job["id"], owner_id)
+                    st.rerun()
+
+        # Everything finished: rerun the page once so polling stops
+        if pending and not any(job["status"] in (QUEUED, RUNNING) for job in jobs):
+            st.rerun()
+
+    # Poll only while something is still running
+    pending = get_job_queue().pending_count(owner_id) > 0
+    st.fragment(show_jobs, run_every=2 if pending else None)()
 
 # Information section
 st.markdown("---")
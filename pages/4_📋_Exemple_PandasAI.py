@@ -5,9 +5,14 @@ import os
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.data_loader import load_data, get_column_info
-from utils.config import get_agent
+from utils.data_loader import load_agent_data, get_column_info
+from utils.agent_runner import run_query
+from utils.responses import figure_png, to_plotly_figure
+from utils.agent_pool import get_agent_pool, get_session_agent
 from utils.auth import require_api_key, get_api_key, get_selected_model
+from utils.batch_runner import run_examples, DEFAULT_MAX_CONCURRENCY
+from utils.chart_store import get_chart_store
+from utils.scheduler import get_scheduler, get_session_id, scheduled_as
 
 st.set_page_config(page_title="Exemple PandasAI", page_icon="📋", layout="wide")
 
@@ -18,18 +23,36 @@ st.title("📋 Galerie Exemple PandasAI")
 st.markdown("Explorează exemple practice de utilizare a PandasAI pentru diferite scenarii de analiză")
 
 # Load data
-df = load_data()
+df = load_agent_data()
 column_info = get_column_info()
 
-# Initialize agent
-if "agent_examples" not in st.session_state:
-    with st.spinner("Inițializez PandasAI Agent..."):
-        st.session_state.agent_examples = get_agent(df, get_api_key(), get_selected_model())
+# Conversation agent from the shared pool; the LLM client and dataframe
+# are shared with other sessions, only the conversation memory is ours
+agent_examples = get_session_agent("examples", df, get_api_key(), get_selected_model())
 
 # Initialize history
 if "examples_history" not in st.session_state:
     st.session_state.examples_history = []
 
+def history_entry(category, title, query, response):
+    """History item for a response; its chart is kept in the shared chart store"""
+    chart_id = None
+    if response.chart:
+        chart_id = get_chart_store().put(response.chart)
+        get_chart_store().acquire(chart_id)
+    if response.figure is not None:
+        # Start the PNG export now so it is ready when the history shows it
+        figure_png(response.figure)
+    return {
+        "category": category,
+        "title": title,
+        "query": query,
+        "response": response.value,
+        "chart": chart_id,
+        # Plotly specs are small, so they stay in the history as they are
+        "figure": response.figure
+    }
+
 # Example categories
 st.header("🎯 Categorii de Exemple")
 
@@ -179,6 +202,82 @@ example_categories = {
     ]
 }
 
+def run_examples_batch(items):
+    """Run several examples concurrently, streaming results into the history"""
+    progress = st.progress(0.0, text=f"0/{len(items)} exemple finalizate")
+    status_box = st.container()
+    
+    def record_result(result, completed, total):
+        if result["error"] is None:
+            st.session_state.examples_history.append(history_entry(
+                result["category"], result["title"], result["query"], result["response"]
+            ))
+            status_box.write(f"✅ {result['title']} ({result['duration']:.1f}s)")
+        else:
+            status_box.write(f"❌ {result['title']}: {result['error']}")
+        progress.progress(completed / total, text=f"{completed}/{total} exemple finalizate")
+    
+    api_key = get_api_key()
+    model = get_selected_model()
+    session_id = get_session_id()
+    
+    def ask(agent, query):
+        # Batch workers queue as this session, so a large batch only uses its fair share
+        with scheduled_as(session_id):
+            return run_query(agent, query, df)
+    
+    run_examples(
+        items,
+        agent_factory=lambda: get_agent_pool().create_agent(df, api_key, model),
+        ask=ask,
+        max_concurrency=st.session_state.get("batch_concurrency", DEFAULT_MAX_CONCURRENCY),
+        on_result=record_result
+    )
+
+# Batch execution
+with st.container():
+    col1, col2, col3 = st.columns([2, 2, 1])
+    
+    with col1:
+        batch_category = st.selectbox(
+            "Rulează în lot:",
+            options=["Toate categoriile"] + list(example_categories.keys()),
+            key="batch_category"
+        )
+    
+    with col2:
+        st.slider(
+            "Exemple rulate simultan:",
+            min_value=1,
+            max_value=8,
+            value=DEFAULT_MAX_CONCURRENCY,
+            key="batch_concurrency",
+            help="Numărul maxim de cereri trimise în paralel către modelul AI"
+        )
+    
+    with col3:
+        st.write("")
+        run_batch = st.button("⏩ Rulează Lotul", type="primary", use_container_width=True)
+    
+    if run_batch:
+        if batch_category == "Toate categoriile":
+            batch_items = [
+                (category, example)
+                for category, examples in example_categories.items()
+                for example in examples
+            ]
+        else:
+            batch_items = [(batch_category, example) for example in example_categories[batch_category]]
+        run_examples_batch(batch_items)
+    
+    scheduler_stats = get_scheduler().stats()
+    st.caption(
+        f"Cereri AI în curs: {scheduler_stats['running']} · în așteptare: {scheduler_stats['queue_depth']} · "
+        f"timp mediu de așteptare: {scheduler_stats['avg_wait']:.1f}s (p95 {scheduler_stats['p95_wait']:.1f}s)"
+    )
+
+st.markdown("---")
+
 # Display examples by category
 for category, examples in example_categories.items():
     with st.expander(f"**{category}**", expanded=False):
@@ -194,23 +293,12 @@ for category, examples in example_categories.items():
                 if st.button("▶️ Rulează", key=f"{category}_{idx}", use_container_width=True):
                     with st.spinner("PandasAI procesează..."):
                         try:
-                            # Delete old chart before processing
-                            chart_path = "exports/charts/temp_chart.png"
-                            if os.path.exists(chart_path):
-                                try:
-                                    os.remove(chart_path)
-                                except:
-                                    pass
-                            
-                            response = st.session_state.agent_examples.chat(example['query'])
+                            response = run_query(agent_examples, example['query'], df)
                             
                             # Add to history
-                            st.session_state.examples_history.append({
-                                "category": category,
-                                "title": example['title'],
-                                "query": example['query'],
-                                "response": response
-                            })
+                            st.session_state.examples_history.append(history_entry(
+                                category, example['title'], example['query'], response
+                            ))
                             
                             # Display result
                             st.success("✅ Executat cu succes!")
@@ -225,6 +313,9 @@ if st.session_state.examples_history:
     st.header("📜 Istoric Execuții")
     
     if st.button("🗑️ Șterge Istoric"):
+        for item in st.session_state.examples_history:
+            if item.get('chart'):
+                get_chart_store().release(item['chart'])
         st.session_state.examples_history = []
         st.rerun()
     
@@ -238,13 +329,25 @@ if st.session_state.examples_history:
                 st.write(response)
             elif isinstance(response, (pd.DataFrame, pd.Series)):
                 st.dataframe(response, use_container_width=True)
-            else:
+            elif response is not None:
                 st.write(str(response))
             
-            # Check for charts
-            chart_path = "exports/charts/temp_chart.png"
-            if os.path.exists(chart_path):
-                st.image(chart_path)
+            # Each history entry keeps the chart of its own run (as a thumbnail)
+            if item.get('figure') is not None:
+                st.plotly_chart(to_plotly_figure(item['figure']), use_container_width=True,
+                                key=f"history_figure_{idx}")
+                png = figure_png(item['figure'])
+                if png is None:
+                    st.caption("🖼️ Imaginea PNG pentru export se pregătește...")
+                elif png:
+                    st.download_button("📥 Descarcă PNG", png, file_name="grafic.png", mime="image/png",
+                                       key=f"history_png_{idx}")
+            if item.get('chart'):
+                thumbnail = get_chart_store().get(item['chart'], thumbnail=True)
+                if thumbnail is None:
+                    st.caption("Graficul nu mai este disponibil.")
+                else:
+                    st.image(thumbnail)
 
 # Custom query section
 st.markdown("---")
@@ -260,35 +363,26 @@ if st.button("🚀 Execută Întrebare Personalizată", type="primary"):
     if custom_query:
         with st.spinner("PandasAI procesează întrebarea ta..."):
             try:
-                # Delete old chart before processing
-                chart_path = "exports/charts/temp_chart.png"
-                if os.path.exists(chart_path):
-                    try:
-                        os.remove(chart_path)
-                    except:
-                        pass
-                
-                response = st.session_state.agent_examples.chat(custom_query)
+                response = run_query(agent_examples, custom_query, df)
                 
                 st.subheader("📊 Rezultat:")
-                if isinstance(response, str):
-                    st.write(response)
-                elif isinstance(response, (pd.DataFrame, pd.Series)):
-                    st.dataframe(response, use_container_width=True)
-                else:
-                    st.write(str(response))
+                if isinstance(response.value, str):
+                    st.write(response.value)
+                elif isinstance(response.value, (pd.DataFrame, pd.Series)):
+                    st.dataframe(response.value, use_container_width=True)
+                elif response.value is not None:
+                    st.write(str(response.value))
                 
-                # Check for newly generated charts
-                if os.path.exists(chart_path):
-                    st.image(chart_path)
+                # The chart drawn for this query, captured in memory
+                if response.figure is not None:
+                    st.plotly_chart(to_plotly_figure(response.figure), use_container_width=True)
+                if response.chart:
+                    st.image(response.chart)
                 
                 # Add to history
-                st.session_state.examples_history.append({
-                    "category": "✍️ Custom",
-                    "title": "Întrebare Personalizată",
-                    "query": custom_query,
-                    "response": response
-                })
+                st.session_state.examples_history.append(history_entry(
+                    "✍️ Custom", "Întrebare Personalizată", custom_query, response
+                ))
             
             except Exception as e:
                 st.error(f"❌ Eroare: {str(e)}")
@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import agent_pool
+from utils.agent_pool import DISCONNECTED_GRACE_SECONDS, AgentPool
+
+MODEL = "qwen/qwen-2.5-72b-instruct:free"
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"Country": ["Romania", "Bulgaria"], "Year": [2000, 2000], "GDP": [1.0, 2.0]})
+
+
+@pytest.fixture
+def slow_build(monkeypatch):
+    built = []
+
+    def build_agent(data, llm):
+        time.sleep(0.2)
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(agent_pool, "build_agent", build_agent)
+    return built
+
+
+def test_agents_are_built_outside_the_lock(df, slow_build):
+    pool = AgentPool()
+    results = {}
+    threads = [
+        threading.Thread(target=lambda s=s: results.update({s: pool.get_agent(s, "chat", df, "sk-test", MODEL)}))
+        for s in ("a", "b")
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Both sessions built their agents at the same time
+    assert time.monotonic() - started < 0.35
+    assert results["a"] is not results["b"]
+
+
+def test_concurrent_builds_publish_one_agent(df, slow_build):
+    pool = AgentPool()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(pool.get_agent("a", "chat", df, "sk-test", MODEL)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(agent is results[0] for agent in results)
+    assert pool.get_agent("a", "chat", df, "sk-test", MODEL) is results[0]
+
+
+def test_ended_sessions_are_evicted_after_the_grace_period(df, slow_build, monkeypatch):
+    pool = AgentPool()
+    agent = pool.get_agent("gone", "chat", df, "sk-test", MODEL)
+    pool.get_agent("here", "chat", df, "sk-test", MODEL)
+    monkeypatch.setattr(pool, "_ended_sessions", lambda: {"gone"})
+
+    pool._evict_idle(time.monotonic())
+    assert pool.stats()["conversations"] == 2
+
+    pool._evict_idle(time.monotonic() + DISCONNECTED_GRACE_SECONDS + 1)
+    assert pool.stats()["conversations"] == 1
+    assert pool.get_agent("gone", "chat", df, "sk-test", MODEL) is not agent
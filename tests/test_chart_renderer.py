@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.chart_renderer import UNAVAILABLE, ChartRenderer, _render_spec
+
+LINE = {"type": "scatter", "mode": "lines", "x": [2000, 2001], "y": [1.0, 2.0], "name": "Romania"}
+
+
+def test_single_axis_chart_renders():
+    png = _render_spec(json.dumps({"data": [LINE], "layout": {}}), {})
+    assert png.startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("spec", [
+    {"data": [LINE, dict(LINE, yaxis="y2")], "layout": {"yaxis2": {"overlaying": "y", "side": "right"}}},
+    {"data": [LINE, dict(LINE, xaxis="x2", yaxis="y2")], "layout": {"xaxis2": {}, "yaxis2": {}}},
+    {"data": [dict(LINE, yaxis="y3")], "layout": {}},
+])
+def test_multi_axis_charts_are_unavailable(spec):
+    assert _render_spec(json.dumps(spec), {}) == UNAVAILABLE
+
+
+class BrokenExecutor:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_pool_gives_unavailable():
+    renderer = ChartRenderer(workers=1)
+    renderer._executor = BrokenExecutor()
+    assert renderer.render({"data": [LINE], "layout": {}}) == UNAVAILABLE
+    assert renderer._executor is None
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.data_index import get_data_index, select_rows
+from utils.frame_registry import register_frame
+
+
+def mask_select(df, countries, years):
+    mask = df["Country"].isin(countries) & (df["Year"] >= years[0]) & (df["Year"] <= years[1])
+    return df[mask]
+
+
+@pytest.fixture
+def loaded():
+    """A frame registered the way load_data() registers the dataset"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Country": np.repeat(["Bulgaria", "Greece", "Romania", "Turkey"], 10),
+        "Year": np.tile(np.arange(1992, 2002), 4),
+        "GDP": rng.normal(100, 20, 40),
+    })
+    register_frame(df, dataset_version="test-loaded")
+    return df
+
+
+def test_loaded_frame_uses_index(loaded):
+    assert get_data_index(loaded) is not None
+    pd.testing.assert_frame_equal(
+        select_rows(loaded, ["Romania"], (2000, 2001)), mask_select(loaded, ["Romania"], (2000, 2001))
+    )
+
+
+def test_sorted_frame_does_not_reuse_index(loaded):
+    resorted = loaded.sort_values(["Year", "Country"])
+    assert get_data_index(resorted) is None
+    selected = select_rows(resorted, ["Romania"], (2000, 2001))
+    assert list(selected["Country"]) == ["Romania", "Romania"]
+    assert list(selected["Year"]) == [2000, 2001]
+
+
+def test_derived_frames_fall_back_to_masks(loaded):
+    derived = [
+        loaded.assign(GDP=loaded["GDP"] * 2),
+        loaded.sample(frac=1, random_state=1),
+        loaded.copy(),
+        loaded.reset_index(drop=True).iloc[::-1],
+    ]
+    for df in derived:
+        assert get_data_index(df) is None
+        pd.testing.assert_frame_equal(
+            select_rows(df, ["Greece", "Turkey"], (1995, 1997)), mask_select(df, ["Greece", "Turkey"], (1995, 1997))
+        )
+
+
+def test_mutated_loaded_frame_is_not_indexed(loaded):
+    loaded["FDI"] = 1.0
+    assert get_data_index(loaded) is None
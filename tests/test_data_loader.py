@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.aggregate_cube import get_aggregate_cube
+from utils.data_loader import get_columnar_path, get_dataset_version, load_columnar
+
+CSV = """Country,Year,GDP,FDI,IU,MCS,PA,EF
+Romania,2000,100,1.5,10,20,5,60
+Romania,2001,110,,12,25,6,61
+Bulgaria,2000,80,2.5,8,15,3,58
+Bulgaria,2001,,3.0,9,18,4,59
+"""
+
+
+@pytest.fixture
+def loaded(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(CSV)
+    return load_columnar(str(path), cache_dir=str(tmp_path / "cache"), compact=False)
+
+
+def test_loaded_frame_keeps_its_version_and_file(loaded):
+    assert get_columnar_path(loaded) is not None
+    assert get_dataset_version(loaded) == get_dataset_version(loaded.copy())
+
+
+def test_derived_frames_get_their_own_version(loaded):
+    version = get_dataset_version(loaded)
+    derived = [
+        loaded.assign(GDP=loaded["GDP"] * 2),
+        loaded.sort_values(["Year", "Country"]),
+    ]
+    for df in derived:
+        assert get_dataset_version(df) != version
+        assert get_columnar_path(df) is None
+
+
+def test_aggregate_cube_follows_changed_data(loaded):
+    doubled = loaded.assign(GDP=loaded["GDP"] * 2)
+    original = get_aggregate_cube(loaded).stats("GDP", ["Romania"])
+    changed = get_aggregate_cube(doubled).stats("GDP", ["Romania"])
+    assert changed.loc["Romania", "mean"] == pytest.approx(2 * original.loc["Romania", "mean"])
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.query_router import parse_query, route_query
+
+
+@pytest.fixture(scope="module")
+def df():
+    rows = [
+        {"Country": country, "Year": year, "GDP": base + year - 1990, "FDI": 1.0 + (year % 3),
+         "IU": 10.0, "MCS": 20.0, "PA": 5.0, "EF": 60.0}
+        for country, base in [("Romania", 100), ("Bulgaria", 80), ("Turkey", 120), ("Greece", 200)]
+        for year in range(1990, 2024)
+    ]
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("question", [
+    # Qualifiers the templates can't express
+    "median GDP for Romania over the first 5 years",
+    "Care este media PIB pentru România în primii 5 ani?",
+    "maximum GDP for Romania in the first half of the period",
+    "total GDP divided by population for Romania",
+    "mean GDP where Year is even",
+    "average GDP for Romania, in euros",
+    "Top 3 ani cu cel mai mic FDI pentru România, doar anii pari",
+    # Exclusions, breakdowns and loose periods
+    "average GDP excluding Greece",
+    "media GDP fără anul 2020",
+    "max GDP per country",
+    "media GDP în anii 90",
+    "Compară media GDP între perioada 1990-2000 și 2010-2020 pentru toate țările",
+    # Places the data doesn't have
+    "Moldova GDP mean",
+    "media GDP pentru Germania",
+    "media GDP România și Germania",
+    # Charts and derived statistics
+    "Arată evoluția GDP pentru toate țările între 2010 și 2020",
+    "Calculează rata de creștere anuală a Internet Users pentru România",
+    "Care este corelația dintre GDP și Internet Users?",
+])
+def test_questions_beyond_the_templates_go_to_the_llm(df, question):
+    assert parse_query(question, df) is None
+    assert route_query(question, df) is None
+
+
+@pytest.mark.parametrize("question, op", [
+    ("Care este media GDP pentru România în toată perioada?", "mean"),
+    ("Care este valoarea maximă a Internet Users și în ce an a fost atinsă?", "max"),
+    ("Câte înregistrări avem pentru fiecare țară?", "count"),
+    ("Arată-mi top 5 ani cu cel mai mare GDP pentru Bulgaria", "rank"),
+    ("Compară GDP-ul mediu între România și Bulgaria", "compare"),
+    ("Cu cât diferă Mobile Subscriptions între Turcia și Grecia în 2020?", "difference"),
+    ("median GDP for Greece in the last 10 years", "median"),
+    ("Which country has the lowest internet users in 2015?", "rank"),
+])
+def test_template_questions_are_parsed(df, question, op):
+    intent = parse_query(question, df)
+    assert intent is not None and intent["op"] == op
+
+
+def test_year_range_is_applied(df):
+    answer = route_query("What is the average GDP of Romania between 2000 and 2010?", df)
+    assert "115.00" in answer
@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.scheduler import FairScheduler, QueueCancelled
+
+
+def test_cancelled_waiter_leaves_without_a_token():
+    # Two tokens and (practically) no refill: whoever is admitted spends one
+    scheduler = FairScheduler(max_concurrency=1, rate_per_minute=0.001, burst=2)
+    scheduler.acquire("key", session_id="a")
+
+    cancelled = threading.Event()
+    errors = []
+
+    def queued():
+        try:
+            scheduler.acquire("key", session_id="b", cancelled=cancelled)
+        except QueueCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=queued)
+    thread.start()
+    while scheduler.stats()["queue_depth"] == 0:
+        time.sleep(0.01)
+    cancelled.set()
+    scheduler.wake()
+    thread.join(timeout=2)
+
+    assert errors and scheduler.stats()["queue_depth"] == 0
+    scheduler.release()
+    # The second token is still there for the next call
+    scheduler.acquire("key", session_id="c", timeout=0.5)
+
+
+def test_cancelled_waiter_is_not_admitted_by_others():
+    scheduler = FairScheduler(max_concurrency=1, rate_per_minute=0.001, burst=1)
+    scheduler.acquire("other", session_id="a")
+    cancelled = threading.Event()
+    thread = threading.Thread(
+        target=lambda: pytest.raises(QueueCancelled, scheduler.acquire, "key", session_id="b", cancelled=cancelled)
+    )
+    thread.start()
+    while scheduler.stats()["queue_depth"] == 0:
+        time.sleep(0.01)
+    cancelled.set()
+    # Freeing the slot dispatches from this thread; the cancelled waiter must be skipped
+    scheduler.release()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    scheduler.acquire("key", session_id="c", timeout=0.5)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+import time
+
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.config import build_agent, OpenRouterLLM
+from utils.data_loader import get_dataset_version
+from utils.memory_policy import MemoryPolicy
+from utils.prompt_context import build_dataframe_connector
+
+DEFAULT_IDLE_SECONDS = 30 * 60
+# Streamlit keeps a disconnected session this long (server.disconnectedSessionTTL)
+# in case the browser reconnects
+DISCONNECTED_GRACE_SECONDS = 120
+
+
+class _SharedState:
+    """Immutable state shared by every conversation on one (model, dataset version)"""
+
+    def __init__(self, model, dataset_version, df):
+        self.model = model
+        self.dataset_version = dataset_version
+        # One read-only dataframe (wrapped once) for all sessions
+        self.df = df
+        self.data = build_dataframe_connector(df)
+        self.llms = {}
+        self.last_used = time.monotonic()
+
+
+class _Handle:
+    """A session's conversation: its own agent memory on top of shared state"""
+
+    def __init__(self, pool_key, llm_key, agent):
+        self.pool_key = pool_key
+        self.llm_key = llm_key
+        self.agent = agent
+        self.last_used = time.monotonic()
+
+
+class AgentPool:
+    """Process-level pool of PandasAI agents.
+
+    Dataframes and OpenRouterLLM instances are shared per (model, dataset
+    version); each session only owns a lightweight agent holding its
+    conversation memory. Conversations idle for longer than idle_seconds, or
+    whose session has ended, are evicted, and shared state is dropped once
+    no conversation uses it.
+    """
+
+    def __init__(self, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._shared = {}
+        self._handles = {}
+
+    def get_agent(self, session_id, name, df, api_key, model, hedging=False):
+        """Return the agent for this session's conversation `name`"""
+        pool_key = (model, get_dataset_version(df))
+        # LLMs carry the API key, so they are shared between sessions using the same key
+        llm_key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), hedging)
+        handle_key = (session_id, name)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            agent = self._current_agent(handle_key, pool_key, llm_key, now)
+            if agent is not None:
+                return agent
+            shared, llm = self._shared_state(pool_key, llm_key, df, api_key, model, hedging, now)
+
+        # Building an agent is slow; other sessions shouldn't wait for it
+        agent = build_agent(shared.data, llm)
+        with self._lock:
+            # A concurrent run of this session may have published one meanwhile
+            current = self._current_agent(handle_key, pool_key, llm_key, time.monotonic())
+            if current is not None:
+                return current
+            self._shared.setdefault(pool_key, shared)
+            self._handles[handle_key] = _Handle(pool_key, llm_key, agent)
+            return agent
+
+    def _current_agent(self, handle_key, pool_key, llm_key, now):
+        handle = self._handles.get(handle_key)
+        if handle is None or handle.pool_key != pool_key or handle.llm_key != llm_key:
+            return None
+        handle.last_used = now
+        self._shared[pool_key].last_used = now
+        return handle.agent
+
+    def create_agent(self, df, api_key, model, hedging=False):
+        """Return a fresh, untracked agent over the shared state (e.g. for batch runs)"""
+        pool_key = (model, get_dataset_version(df))
+        llm_key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), hedging)
+        with self._lock:
+            shared, llm = self._shared_state(
+                pool_key, llm_key, df, api_key, model, hedging, time.monotonic()
+            )
+        return build_agent(shared.data, llm)
+
+    def _shared_state(self, pool_key, llm_key, df, api_key, model, hedging, now):
+        shared = self._shared.get(pool_key)
+        if shared is None:
+            shared = _SharedState(model, pool_key[1], df)
+            self._shared[pool_key] = shared
+        shared.last_used = now
+
+        llm = shared.llms.get(llm_key)
+        if llm is None:
+            llm = OpenRouterLLM(
+                api_token=api_key,
+                model=model,
+                dataset_version=shared.dataset_version,
+                hedging=hedging,
+                memory_policy=MemoryPolicy.from_env()
+            )
+            shared.llms[llm_key] = llm
+        return shared, llm
+
+    def _ended_sessions(self):
+        """Sessions with conversations here that Streamlit no longer has connected"""
+        if not runtime.exists():
+            return set()
+        is_active = runtime.get_instance().is_active_session
+        return {key[0] for key in self._handles if key[0] != "default" and not is_active(key[0])}
+
+    def _evict_idle(self, now):
+        ended = self._ended_sessions()
+        for key, handle in list(self._handles.items()):
+            idle = now - handle.last_used
+            if idle > self.idle_seconds or (key[0] in ended and idle > DISCONNECTED_GRACE_SECONDS):
+                del self._handles[key]
+
+        in_use = {handle.pool_key for handle in self._handles.values()}
+        for key, shared in list(self._shared.items()):
+            if key not in in_use and now - shared.last_used > self.idle_seconds:
+                del self._shared[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "conversations": len(self._handles),
+                "shared_datasets": len(self._shared),
+                "llms": sum(len(shared.llms) for shared in self._shared.values()),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_pool():
+    """Return the process-wide agent pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AgentPool(
+                idle_seconds=float(os.environ.get("AGENT_POOL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS))
+            )
+        return _pool
+
+
+def get_session_agent(name, df, api_key, model, hedging=False):
+    """Return the pooled agent for the current Streamlit session"""
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx is not None else "default"
+    return get_agent_pool().get_agent(session_id, name, df, api_key, model, hedging=hedging)
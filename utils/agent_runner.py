@@ -0,0 +1,108 @@
+from utils.code_cache import get_code_cache
+from utils.code_executor import CodeExecutionTimeout, run_in_pool
+from utils.data_loader import get_dataset_version
+from utils.query_router import route_query
+from utils.responses import QueryResponse
+
+# PandasAI answers with a string like this instead of raising when it fails
+FAILURE_PREFIXES = ("Unfortunately, I was not able", "Unfortunately, I was unable")
+
+
+def _is_valid_code(code):
+    """Only keep code that compiles and produces a PandasAI result"""
+    if not code or "result" not in code:
+        return False
+    try:
+        compile(code, "<generated>", "exec")
+    except SyntaxError:
+        return False
+    return True
+
+
+def _cache_key(agent, question, df):
+    """The question with the data version and the conversation window sent with it.
+
+    Follow-ups ("the same chart for Bulgaria") only mean something in their
+    context, so code is only shared between identical windows. PandasAI
+    only ever sends the last memory_size messages, so older turns don't
+    split the cache.
+    """
+    memory = getattr(getattr(agent, "context", None), "memory", None)
+    window = []
+    if memory is not None:
+        size = getattr(memory, "_memory_size", None) or memory.count() + 1
+        # Once the question is added, it and the size - 1 messages before it are sent
+        if size > 1:
+            window = memory.get_messages(size - 1)
+    return "\n".join([get_dataset_version(df)] + window + [question])
+
+
+def _remember(agent, question, response):
+    """Add an answer that bypassed agent.chat to the agent's memory"""
+    if not hasattr(agent, "add_message"):
+        return
+    # Same summaries PandasAI stores for its own answers
+    if response.figure is not None or response.chart:
+        answer = "Check it out: <plot>"
+    elif hasattr(response.value, "to_frame") or hasattr(response.value, "columns"):
+        answer = "Check it out: <dataframe>"
+    else:
+        answer = str(response.value)
+    agent.add_message(question, is_user=True)
+    agent.add_message(answer, is_user=False)
+
+
+def run_query(agent, question, df):
+    """Answer a question, reusing previously generated code when possible.
+
+    Simple template questions are answered directly by the local query
+    router without involving PandasAI at all. On a code cache hit the stored
+    code runs in the isolated worker pool against df without calling the
+    LLM. On a miss the question goes through agent.chat and the code
+    PandasAI executed is stored for next time.
+
+    Cached code is keyed by the question together with the data version and
+    the conversation window PandasAI sends with it, and answers that skip
+    agent.chat are still added to the agent's memory so later follow-ups
+    keep their context.
+
+    Returns a QueryResponse carrying the answer and any chart it drew.
+    """
+    answer = route_query(question, df)
+    if answer is not None:
+        response = QueryResponse(answer)
+        _remember(agent, question, response)
+        return response
+
+    cache = get_code_cache()
+    key = _cache_key(agent, question, df)
+    code = cache.get(key, df)
+    if code is not None:
+        try:
+            response = QueryResponse.from_result(run_in_pool(code, df, get_dataset_version(df)))
+        except CodeExecutionTimeout:
+            # Regenerating would most likely produce equally slow code
+            raise
+        except Exception:
+            # The stored code no longer fits the data; regenerate it
+            cache.invalidate(key, df)
+        else:
+            _remember(agent, question, response)
+            return response
+
+    # Never store code left over from an earlier question under this one
+    agent.last_runnable_code = None
+    agent.last_code_executed = None
+    response = agent.chat(question)
+    if not isinstance(response, QueryResponse):
+        # Failure messages bypass the response parser
+        response = QueryResponse(response)
+
+    if isinstance(response.value, str) and response.value.startswith(FAILURE_PREFIXES):
+        return response
+
+    # The code as it ran in the worker pool, including its imports
+    code = getattr(agent, "last_runnable_code", None) or getattr(agent, "last_code_executed", None)
+    if _is_valid_code(code):
+        cache.set(key, df, code)
+    return response
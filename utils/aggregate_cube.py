@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import get_dataset_version
+
+MAX_CUBES = 4
+
+
+class AggregateCube:
+    """Per-(country, year) aggregates of every indicator, with prefix sums.
+
+    For each country the counts, sums and sums of squares are accumulated
+    over the years, so the count, mean and standard deviation over any year
+    range come from two lookups per country. Minimum and maximum use a
+    sparse table over the years (two lookups as well). Values are shifted by
+    the indicator's overall mean before squaring, to keep the variance
+    accurate.
+    """
+
+    def __init__(self, df, indicators=None, country_column="Country", year_column="Year"):
+        if indicators is None:
+            indicators = [
+                col for col in df.columns
+                if col not in (country_column, year_column) and pd.api.types.is_numeric_dtype(df[col])
+            ]
+        self.indicators = list(indicators)
+        data = df[[country_column, year_column] + self.indicators].dropna(subset=[country_column, year_column])
+
+        country = data[country_column]
+        if isinstance(country.dtype, pd.CategoricalDtype):
+            # Same order as groupby on a categorical (category order)
+            self.countries = [c for c in country.cat.categories if c in set(country.unique())]
+        else:
+            self.countries = sorted(country.unique())
+        years = data[year_column].to_numpy()
+        self.first_year = int(years.min()) if len(years) else 0
+        n_years = int(years.max()) - self.first_year + 1 if len(years) else 0
+
+        shape = (len(self.countries), n_years, len(self.indicators))
+        c = pd.Index(self.countries).get_indexer(country).astype(np.intp)
+        y = (years - self.first_year).astype(np.intp)
+        values = data[self.indicators].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        self._shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.indicators))
+        shifted = np.where(valid, values - self._shift, 0.0)
+
+        # Aggregate every (country, year) cell in one pass per statistic
+        flat = c * n_years + y
+        size = shape[0] * shape[1]
+
+        def cell_sums(weights):
+            return np.stack(
+                [np.bincount(flat, weights=weights[:, k], minlength=size) for k in range(shape[2])], axis=-1
+            ).reshape(shape) if shape[2] else np.zeros(shape)
+
+        rows = np.bincount(flat, minlength=size).reshape(shape[:2]).astype(np.float64)
+        counts = cell_sums(valid.astype(np.float64))
+        sums = cell_sums(shifted)
+        squares = cell_sums(shifted ** 2)
+        totals = cell_sums(np.where(valid, values, 0.0))
+        grouped = pd.DataFrame(values).groupby(flat)
+        mins, maxs = np.full((size, shape[2]), np.inf), np.full((size, shape[2]), -np.inf)
+        low, high = grouped.min(), grouped.max()
+        mins[low.index] = low.fillna(np.inf).to_numpy()
+        maxs[high.index] = high.fillna(-np.inf).to_numpy()
+        mins, maxs = mins.reshape(shape), maxs.reshape(shape)
+
+        # Unshifted per-cell totals for single-year lookups
+        self._cell_counts, self._cell_totals = counts, totals
+        self._rows = np.concatenate([np.zeros((shape[0], 1)), rows.cumsum(axis=1)], axis=1)
+        self._counts, self._sums, self._squares = (
+            np.concatenate([np.zeros((shape[0], 1, shape[2])), a.cumsum(axis=1)], axis=1)
+            for a in (counts, sums, squares)
+        )
+        # Sparse tables: level j holds the min/max over 2**j consecutive years
+        self._mins, self._maxs = [mins], [maxs]
+        span = 1
+        while span * 2 <= n_years:
+            self._mins.append(np.minimum(self._mins[-1][:, :-span], self._mins[-1][:, span:]))
+            self._maxs.append(np.maximum(self._maxs[-1][:, :-span], self._maxs[-1][:, span:]))
+            span *= 2
+
+    def _year_slice(self, years):
+        n_years = self._rows.shape[1] - 1
+        if years is None:
+            return 0, n_years
+        start = min(max(int(np.ceil(years[0])) - self.first_year, 0), n_years)
+        end = min(max(int(np.floor(years[1])) - self.first_year + 1, start), n_years)
+        return start, end
+
+    def _country_positions(self, countries):
+        if countries is None:
+            return np.arange(len(self.countries))
+        wanted = set(countries)
+        return np.array([i for i, c in enumerate(self.countries) if c in wanted], dtype=np.intp)
+
+    def stats(self, indicator, countries=None, years=None):
+        """count/mean/std/min/max of indicator per country over an inclusive year range.
+
+        Matches groupby('Country', observed=True)[indicator].agg(...) on the
+        selected rows: countries without rows in the range are left out.
+        """
+        i = self.indicators.index(indicator)
+        start, end = self._year_slice(years)
+        positions = self._country_positions(countries)
+        present = positions[(self._rows[positions, end] - self._rows[positions, start]) > 0]
+
+        n = self._counts[present, end, i] - self._counts[present, start, i]
+        s = self._sums[present, end, i] - self._sums[present, start, i]
+        ss = self._squares[present, end, i] - self._squares[present, start, i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, s / n, np.nan) + self._shift[i]
+            variance = np.where(n > 1, (ss - s * s / n) / (n - 1), np.nan)
+        std = np.sqrt(np.maximum(variance, 0.0))
+
+        if end > start:
+            level = int(np.log2(end - start))
+            width = 1 << level
+            lows = np.minimum(self._mins[level][present, start, i], self._mins[level][present, end - width, i])
+            highs = np.maximum(self._maxs[level][present, start, i], self._maxs[level][present, end - width, i])
+        else:
+            lows = highs = np.full(len(present), np.inf)
+        lows = np.where(np.isfinite(lows), lows, np.nan)
+        highs = np.where(np.isfinite(highs), highs, np.nan)
+
+        index = pd.Index([self.countries[p] for p in present], name="Country")
+        return pd.DataFrame({"count": n, "mean": mean, "std": std, "min": lows, "max": highs}, index=index)
+
+    def year_values(self, year, countries=None):
+        """Each country's total per indicator in one year (NaN where it has no values)"""
+        start, end = self._year_slice((year, year))
+        positions = self._country_positions(countries)
+        if end <= start:
+            return pd.DataFrame(columns=["Country"] + self.indicators)
+        present = positions[self._rows[positions, end] - self._rows[positions, start] > 0]
+        counts = self._cell_counts[present, start]
+        totals = self._cell_totals[present, start]
+        data = pd.DataFrame(np.where(counts > 0, totals, np.nan), columns=self.indicators)
+        data.insert(0, "Country", [self.countries[p] for p in present])
+        return data
+
+
+_cubes = OrderedDict()
+_cubes_lock = threading.Lock()
+
+
+def get_aggregate_cube(df):
+    """Return the cube for df's dataset version, building it on first use"""
+    version = get_dataset_version(df)
+    with _cubes_lock:
+        cube = _cubes.get(version)
+        if cube is not None:
+            _cubes.move_to_end(version)
+            return cube
+
+    cube = AggregateCube(df)
+    with _cubes_lock:
+        _cubes[version] = cube
+        while len(_cubes) > MAX_CUBES:
+            _cubes.popitem(last=False)
+    return cube
@@ -1,5 +1,5 @@
 import streamlit as st
-from utils.config import test_openrouter_connection
+from utils.config import test_openrouter_connection, MODEL_OPTIONS
 
 def init_session_state():
     """Initialize session state variables"""
@@ -61,10 +61,7 @@ def show_api_key_input():
         st.sidebar.markdown("---")
         st.sidebar.subheader("🤖 Selectare Model")
         
-        model_options = {
-            "Qwen2.5 72B Instruct": "qwen/qwen-2.5-72b-instruct:free",
-            "Meta: Llama 3.3 70B Instruct": "meta-llama/llama-3.3-70b-instruct:free"
-        }
+        model_options = MODEL_OPTIONS
         
         # Find current model display name
         current_model_display = None
@@ -87,13 +84,7 @@ def show_api_key_input():
         new_model = model_options[selected_display]
         if new_model != st.session_state.selected_model:
             st.session_state.selected_model = new_model
-            # Clear agents to force recreation with new model
-            if "agent" in st.session_state:
-                del st.session_state.agent
-            if "agent_advanced" in st.session_state:
-                del st.session_state.agent_advanced
-            if "agent_examples" in st.session_state:
-                del st.session_state.agent_examples
+            # Pooled agents are keyed by model, so the next run picks up the new one
             st.rerun()
         
         st.sidebar.markdown("---")
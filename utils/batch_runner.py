@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def _chat(agent, query):
+    return agent.chat(query)
+
+
+async def _run_example(semaphore, agent_factory, ask, category, example):
+    """Run a single example once a concurrency slot is free"""
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            # PandasAI agents are synchronous and keep per-conversation state,
+            # so every example gets its own agent and runs on a worker thread
+            agent = await asyncio.to_thread(agent_factory)
+            response = await asyncio.to_thread(ask, agent, example["query"])
+            error = None
+        except Exception as e:
+            response = None
+            error = str(e)
+
+        return {
+            "category": category,
+            "title": example["title"],
+            "query": example["query"],
+            "response": response,
+            "error": error,
+            "duration": time.monotonic() - started,
+        }
+
+
+async def _run_examples(items, agent_factory, ask, max_concurrency, on_result):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        asyncio.create_task(_run_example(semaphore, agent_factory, ask, category, example))
+        for category, example in items
+    ]
+
+    results = []
+    for finished in asyncio.as_completed(tasks):
+        result = await finished
+        results.append(result)
+        if on_result is not None:
+            on_result(result, len(results), len(tasks))
+    return results
+
+
+def run_examples(items, agent_factory, max_concurrency=DEFAULT_MAX_CONCURRENCY, on_result=None,
+                 ask=_chat):
+    """Run (category, example) pairs concurrently and return results in completion order.
+
+    on_result(result, completed, total) is called from the calling thread as
+    each example finishes, so it can safely update Streamlit elements.
+    ask(agent, query) answers one example; it defaults to agent.chat.
+    """
+    if not items:
+        return []
+    return asyncio.run(_run_examples(items, agent_factory, ask, max(1, max_concurrency), on_result))
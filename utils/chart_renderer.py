@@ -0,0 +1,267 @@
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_CACHE_MB = 64
+DEFAULT_RENDER_TIMEOUT = 30.0
+# Returned instead of a PNG for figures that can't be exported
+UNAVAILABLE = b""
+MAX_UNAVAILABLE = 512
+SUPPORTED_TRACES = ("scatter", "scattergl", "bar", "histogram", "box")
+EXTRA_AXIS = re.compile(r"^[xy]axis\d+$")
+
+
+def spec_hash(spec):
+    """Stable hash of a plotly figure spec"""
+    payload = json.dumps(spec, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (pre-warm the import)
+
+
+def _title(value):
+    if isinstance(value, dict):
+        return value.get("text") or ""
+    return value or ""
+
+
+def _values(data):
+    """Decode a plotly data array (plain list or base64 typed array)"""
+    if isinstance(data, dict) and "bdata" in data:
+        import numpy as np
+        values = np.frombuffer(base64.b64decode(data["bdata"]), dtype=data["dtype"])
+        if "shape" in data:
+            values = values.reshape([int(n) for n in str(data["shape"]).split(",")])
+        return values.tolist()
+    return data
+
+
+def _trace_color(trace, colors):
+    if trace.get("name") in colors:
+        return colors[trace["name"]]
+    for key in ("line", "marker"):
+        color = (trace.get(key) or {}).get("color")
+        if isinstance(color, str):
+            return color
+    return None
+
+
+def _single_axes(layout, traces):
+    """Whether every trace shares the one x and y axis (no subplots or twin axes)"""
+    if any(EXTRA_AXIS.match(key) for key in layout):
+        return False
+    return all(t.get("xaxis") in (None, "x") and t.get("yaxis") in (None, "y") for t in traces)
+
+
+def _render_spec(spec_json, colors):
+    """Rasterise a plotly figure spec to PNG with matplotlib (runs in a worker).
+
+    Covers the trace types the app's charts use (lines, scatter, bars,
+    histograms and box plots) on a single pair of axes. Figures with any
+    other trace (heatmaps, pies, ...), with subplots or secondary axes, or
+    with nothing to draw return UNAVAILABLE rather than an image that
+    doesn't match the chart.
+    """
+    import matplotlib.pyplot as plt
+
+    spec = json.loads(spec_json)
+    layout = spec.get("layout") or {}
+    traces = spec.get("data") or []
+    if not traces or any(t.get("type", "scatter") not in SUPPORTED_TRACES for t in traces):
+        return UNAVAILABLE
+    if not _single_axes(layout, traces):
+        return UNAVAILABLE
+    fig, ax = plt.subplots(figsize=(10, 5.5), dpi=100)
+    bars = [t for t in traces if t.get("type") == "bar"]
+    boxes = []
+    drawn = 0
+
+    for trace in traces:
+        kind = trace.get("type", "scatter")
+        name = trace.get("name")
+        color = _trace_color(trace, colors)
+        x, y = _values(trace.get("x")), _values(trace.get("y"))
+        if kind in ("scatter", "scattergl"):
+            if x is None or y is None:
+                continue
+            mode = trace.get("mode") or "lines"
+            drawn += 1
+            if "lines" in mode:
+                ax.plot(x, y, label=name, color=color, marker="o" if "markers" in mode else None, markersize=4)
+            else:
+                ax.scatter(x, y, label=name, color=color, s=16)
+        elif kind == "bar":
+            if x is None or y is None:
+                continue
+            drawn += 1
+            if trace.get("orientation") == "h":
+                ax.barh([str(v) for v in y], x, label=name, color=color)
+            elif len(bars) > 1 and layout.get("barmode") not in ("stack", "relative", "overlay"):
+                # Grouped bars: shift each trace within its category slot
+                index = bars.index(trace)
+                width = 0.8 / len(bars)
+                positions = [i - 0.4 + width * (index + 0.5) for i in range(len(x))]
+                ax.bar(positions, y, width=width, label=name, color=color)
+                ax.set_xticks(range(len(x)), [str(v) for v in x])
+            else:
+                ax.bar([str(v) for v in x], y, label=name, color=color)
+        elif kind == "histogram":
+            values = x if x is not None else y
+            if values is not None:
+                drawn += 1
+                ax.hist([v for v in values if v is not None], bins=trace.get("nbinsx") or 30,
+                        label=name, color=color, alpha=0.6)
+        elif kind == "box":
+            values = y if y is not None else x
+            if values is not None:
+                boxes.append((name or "", [v for v in values if v is not None]))
+
+    if boxes:
+        drawn += len(boxes)
+        ax.boxplot([values for _, values in boxes])
+        ax.set_xticks(range(1, len(boxes) + 1), [name for name, _ in boxes])
+    if not drawn:
+        plt.close(fig)
+        return UNAVAILABLE
+
+    ax.set_title(_title(layout.get("title")))
+    ax.set_xlabel(_title((layout.get("xaxis") or {}).get("title")))
+    ax.set_ylabel(_title((layout.get("yaxis") or {}).get("title")))
+    if sum(1 for t in traces if t.get("name")) > 1:
+        ax.legend()
+    ax.grid(alpha=0.3)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """Renders plotly figure specs to PNG off the Streamlit script thread.
+
+    Rendering runs on a pool of Agg worker processes, so it uses other cores
+    and never blocks a script run. Results are cached by spec hash (an LRU
+    bounded by max_bytes) and concurrent requests for the same spec share
+    one render. Figures that can't be exported (unsupported traces or a
+    failed render) are remembered too, so they are not resubmitted.
+    """
+
+    def __init__(self, workers=None, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.workers = workers or min(2, os.cpu_count() or 1)
+        self.max_bytes = max_bytes
+        self._executor = None
+        # Reentrant: a future that is already done runs _store as soon as
+        # render() adds the callback, while render() still holds the lock
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._size = 0
+        self._unavailable = OrderedDict()
+        self._in_flight = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def render(self, spec, colors=None, wait=True, timeout=DEFAULT_RENDER_TIMEOUT):
+        """Return the PNG for spec, or UNAVAILABLE when it can't be exported.
+
+        Traces named after a key of colors get that colour. With wait=False
+        this only starts the render when needed and returns None until it is
+        ready, so a page can show a placeholder meanwhile.
+        """
+        colors = colors or {}
+        key = spec_hash({"spec": spec, "colors": colors})
+        with self._lock:
+            if key in self._unavailable:
+                return UNAVAILABLE
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                return png
+            future = self._in_flight.get(key)
+            if future is None:
+                try:
+                    future = self._get_executor().submit(_render_spec, json.dumps(spec, default=str), colors)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory); start a fresh pool next time
+                    self._reset_executor()
+                    self._mark_unavailable(key)
+                    return UNAVAILABLE
+                self._in_flight[key] = future
+                executor = self._executor
+                future.add_done_callback(lambda done, key=key: self._store(key, done, executor))
+
+        if not wait:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise
+        except Exception:
+            return UNAVAILABLE
+
+    def _reset_executor(self, executor=None):
+        if self._executor is not None and executor in (None, self._executor):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _mark_unavailable(self, key):
+        self._unavailable[key] = True
+        while len(self._unavailable) > MAX_UNAVAILABLE:
+            self._unavailable.popitem(last=False)
+
+    def _store(self, key, future, executor):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._reset_executor(executor)
+            if future.cancelled() or future.exception() is not None or not future.result():
+                self._mark_unavailable(key)
+                return
+            png = future.result()
+            self._cache[key] = png
+            self._size += len(png)
+            while self._size > self.max_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), "bytes": self._size, "rendering": len(self._in_flight),
+                    "unavailable": len(self._unavailable)}
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_chart_renderer():
+    """Return the process-wide chart renderer"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            workers = os.environ.get("CHART_RENDER_WORKERS")
+            _renderer = ChartRenderer(
+                workers=int(workers) if workers else None,
+                max_bytes=int(float(os.environ.get("CHART_RENDER_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024),
+            )
+        return _renderer
@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_STORE_PATH = os.path.join("cache", "charts")
+DEFAULT_MAX_MB = 200
+DEFAULT_THUMBNAIL_WIDTH = 360
+FORMATS = {"png": ("PNG", {"optimize": True}), "webp": ("WEBP", {"quality": 85, "method": 4})}
+
+
+class ChartStore:
+    """Content-addressed, size-bounded store for chart images.
+
+    Charts are keyed by the hash of their bytes, so the same chart is kept
+    once however many histories show it. Images are recompressed on the way
+    in (optimized PNG or WebP, when Pillow is available) together with a
+    small thumbnail for history rendering. Histories acquire/release the ids
+    they show; when the store grows beyond max_bytes the least recently used
+    unreferenced charts are evicted first, then referenced ones.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 image_format="png", thumbnail_width=DEFAULT_THUMBNAIL_WIDTH):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.image_format = image_format if image_format in FORMATS else "png"
+        self.thumbnail_width = thumbnail_width
+        self._lock = threading.Lock()
+        # chart id -> total bytes on disk (image + thumbnail), in LRU order
+        self._entries = OrderedDict()
+        self._refs = {}
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the index from disk, oldest files first"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and name.endswith(f".{self.image_format}"):
+                files.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(files):
+            chart_id = name.split(".")[0].split("_")[0]
+            self._entries[chart_id] = self._entries.get(chart_id, 0) + size
+            self._entries.move_to_end(chart_id)
+            self._size += size
+
+    def _path(self, chart_id, thumbnail=False):
+        suffix = "_thumb" if thumbnail else ""
+        return os.path.join(self.directory, f"{chart_id}{suffix}.{self.image_format}")
+
+    def _encode(self, data):
+        """Return (image, thumbnail) bytes in the store's format"""
+        if Image is None:
+            return data, data
+        pil_format, options = FORMATS[self.image_format]
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            if pil_format == "WEBP" and img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            buffer = io.BytesIO()
+            img.save(buffer, pil_format, **options)
+            image = buffer.getvalue()
+
+            thumb = img.copy()
+            if thumb.width > self.thumbnail_width:
+                height = max(1, round(thumb.height * self.thumbnail_width / thumb.width))
+                thumb = thumb.resize((self.thumbnail_width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            thumb.save(buffer, pil_format, **options)
+        # Keep the original PNG when recompression doesn't help
+        if self.image_format == "png" and len(image) >= len(data):
+            image = data
+        return image, buffer.getvalue()
+
+    @staticmethod
+    def _write(path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, data):
+        """Store chart bytes and return their id (existing charts are reused)"""
+        chart_id = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            if chart_id in self._entries and os.path.exists(self._path(chart_id)):
+                self._entries.move_to_end(chart_id)
+                return chart_id
+
+        image, thumbnail = self._encode(data)
+        self._write(self._path(chart_id), image)
+        self._write(self._path(chart_id, thumbnail=True), thumbnail)
+
+        with self._lock:
+            self._size -= self._entries.pop(chart_id, 0)
+            self._entries[chart_id] = len(image) + len(thumbnail)
+            self._size += self._entries[chart_id]
+            self._evict(keep=chart_id)
+        return chart_id
+
+    def get(self, chart_id, thumbnail=False):
+        """Return the chart (or its thumbnail) bytes, or None if it was evicted"""
+        try:
+            with open(self._path(chart_id, thumbnail), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            if chart_id in self._entries:
+                self._entries.move_to_end(chart_id)
+        return data
+
+    def acquire(self, chart_id):
+        """Mark a chart as shown in a history"""
+        with self._lock:
+            self._refs[chart_id] = self._refs.get(chart_id, 0) + 1
+
+    def release(self, chart_id):
+        with self._lock:
+            count = self._refs.get(chart_id, 0) - 1
+            if count > 0:
+                self._refs[chart_id] = count
+            else:
+                self._refs.pop(chart_id, None)
+
+    def _evict(self, keep=None):
+        if self._size <= self.max_bytes:
+            return
+        # Unreferenced charts go first, then the least recently used of the rest
+        candidates = [cid for cid in self._entries if cid not in self._refs and cid != keep]
+        candidates += [cid for cid in self._entries if cid in self._refs and cid != keep]
+        for chart_id in candidates:
+            if self._size <= self.max_bytes:
+                break
+            for thumbnail in (False, True):
+                try:
+                    os.remove(self._path(chart_id, thumbnail))
+                except OSError:
+                    pass
+            self._size -= self._entries.pop(chart_id)
+            self._refs.pop(chart_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "charts": len(self._entries),
+                "referenced": len(self._refs),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chart_store():
+    """Return the process-wide chart store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChartStore(
+                directory=os.environ.get("CHART_STORE_PATH", DEFAULT_STORE_PATH),
+                max_bytes=int(float(os.environ.get("CHART_STORE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+                image_format=os.environ.get("CHART_STORE_FORMAT", "png").lower(),
+                thumbnail_width=int(os.environ.get("CHART_THUMBNAIL_WIDTH", DEFAULT_THUMBNAIL_WIDTH)),
+            )
+        return _store
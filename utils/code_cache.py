@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "generated_code.sqlite")
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different phrasings share an entry"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s.-]", " ", text)
+    return re.sub(r"\s+", " ", text).strip(" .")
+
+
+def get_schema_hash(df):
+    """Hash the dataframe schema (column names and dtypes), not its contents"""
+    schema = ",".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+class GeneratedCodeCache:
+    """Stores validated PandasAI code per (normalized question, schema).
+
+    The code is keyed by schema rather than data, so a hit is re-executed
+    against the current dataframe and stays correct when the data changes.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection().execute(
+            """
+            CREATE TABLE IF NOT EXISTS generated_code (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                code TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(question, df):
+        payload = f"{normalize_question(question)}|{get_schema_hash(df)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, question, df):
+        """Return cached code for the question, or None"""
+        row = self._connection().execute(
+            "SELECT code, created_at FROM generated_code WHERE key = ?",
+            (self.make_key(question, df),),
+        ).fetchone()
+        hit = row is not None and time.time() - row[1] <= self.ttl_seconds
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if hit else None
+
+    def set(self, question, df, code):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO generated_code (key, question, code, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (self.make_key(question, df), question, code, time.time()),
+        )
+
+    def invalidate(self, question, df):
+        self._connection().execute(
+            "DELETE FROM generated_code WHERE key = ?", (self.make_key(question, df),)
+        )
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_code_cache():
+    """Return the process-wide generated code cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GeneratedCodeCache(
+                path=os.environ.get("CODE_CACHE_PATH", DEFAULT_CACHE_PATH),
+                ttl_seconds=int(os.environ.get("CODE_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            )
+        return _cache
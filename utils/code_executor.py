@@ -0,0 +1,333 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import base64
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+SHARED_DATA_DIR = os.path.join("cache", "shared")
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_MEMORY_LIMIT_MB = 2048
+MAX_FRAMES_PER_WORKER = 2
+# With copy-on-write (pandas 2+), tasks share the mapped columns and only
+# copy the ones they modify
+COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 2
+
+
+class CodeExecutionTimeout(TimeoutError):
+    """Generated code ran longer than the wall-clock limit and was killed"""
+
+
+class CodeExecutionCrashed(RuntimeError):
+    """The worker process died while running generated code (e.g. memory limit)"""
+
+
+def execute_generated_code(code, df):
+    """Execute PandasAI-generated code against df and return its result dict.
+
+    PandasAI code reads the data from `dfs` and stores its answer in a
+    `result` dict of the form {"type": ..., "value": ...}.
+    """
+    environment = {
+        "pd": pd,
+        "np": np,
+        "plt": plt,
+        "dfs": [df],
+        "df": df,
+    }
+    exec(compile(code, "<generated>", "exec"), environment)
+
+    result = environment.get("result")
+    if not isinstance(result, dict) or "value" not in result:
+        raise ValueError("Generated code did not produce a result")
+    return result
+
+
+def with_imports(code, dependencies):
+    """Prefix code with the import statements PandasAI recorded as dependencies"""
+    lines = []
+    for dependency in dependencies or []:
+        module, name, alias = dependency["module"], dependency["name"], dependency["alias"]
+        if name == module:
+            lines.append(f"import {module}" if alias == name else f"import {module} as {alias}")
+        else:
+            lines.append(f"from {module} import {name} as {alias}")
+    return "\n".join(list(dict.fromkeys(lines)) + [code]) if lines else code
+
+
+def publish_dataframe(df, version):
+    """Write df once per dataset version to a file workers can memory-map"""
+    from utils.data_loader import get_columnar_path
+
+    # The loaded dataset already lives in a mappable file: share that one
+    path = get_columnar_path(df)
+    if path is not None:
+        return path
+
+    os.makedirs(SHARED_DATA_DIR, exist_ok=True)
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        pa = None
+
+    if pa is not None:
+        path = os.path.join(SHARED_DATA_DIR, f"{version}.arrow")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            # Uncompressed Arrow IPC so readers can map it without decoding
+            feather.write_feather(df, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+    else:
+        path = os.path.join(SHARED_DATA_DIR, f"{version}.pkl")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+    return path
+
+
+def _load_published(path):
+    if path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        # Numeric columns stay views of the mapped file, shared by all workers
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+    return pd.read_pickle(path)
+
+
+def _capture_savefig():
+    """Make Figure.savefig write to memory buffers instead of files.
+
+    Installed only in worker processes. Returns the list that collects the
+    PNG bytes of every figure the generated code saves.
+    """
+    from matplotlib.figure import Figure
+
+    captured = []
+    original_savefig = Figure.savefig
+
+    def savefig(self, fname, *args, **kwargs):
+        if hasattr(fname, "write"):
+            return original_savefig(self, fname, *args, **kwargs)
+        buffer = io.BytesIO()
+        kwargs["format"] = "png"
+        original_savefig(self, buffer, *args, **kwargs)
+        captured.append(buffer.getvalue())
+
+    Figure.savefig = savefig
+
+    try:
+        from plotly.basedatatypes import BaseFigure
+    except ImportError:
+        return captured
+    # Plotly figures are returned as specs and drawn by the browser; a
+    # worker must never try to open one
+    BaseFigure.show = lambda self, *args, **kwargs: None
+    return captured
+
+
+def _run_task(code, df, captured):
+    """Run code and attach the chart it drew (PNG bytes) to its result.
+
+    A plotly figure result is replaced by its JSON spec.
+    """
+    captured.clear()
+    plt.close("all")
+    result = execute_generated_code(code, df)
+
+    chart = captured[-1] if captured else None
+    if chart is None and result.get("type") == "plot" and plt.get_fignums():
+        buffer = io.BytesIO()
+        plt.gcf().savefig(buffer, format="png")
+        chart = buffer.getvalue()
+    plt.close("all")
+
+    result = dict(result)
+    result["chart"] = chart
+    if result.get("type") == "plot" and hasattr(result["value"], "to_plotly_json"):
+        # Plotly figure: send its JSON spec instead of rasterising it
+        result["value"] = json.loads(result["value"].to_json())
+        result["chart"] = None
+    elif result.get("type") == "plot" and chart is not None:
+        # The file path the code "saved" to was never written
+        result["value"] = "data:image/png;base64," + base64.b64encode(chart).decode("ascii")
+    return result
+
+
+def _worker_main(conn, memory_limit_mb):
+    """Worker loop: keeps recently used dataframes loaded and runs code on them"""
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    if COPY_ON_WRITE:
+        pd.set_option("mode.copy_on_write", True)
+
+    captured = _capture_savefig()
+    frames = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+
+        kind, path = message[0], message[1]
+        try:
+            if path not in frames:
+                if len(frames) >= MAX_FRAMES_PER_WORKER:
+                    frames.pop(next(iter(frames)))
+                frames[path] = _load_published(path)
+            if kind == "load":
+                continue
+
+            # Loaded frames are read-only maps of the published file. Under
+            # copy-on-write a shallow copy is enough for code to modify its
+            # data in place; older pandas needs a full copy per task
+            df = frames[path].copy(deep=not COPY_ON_WRITE)
+            result = _run_task(message[2], df, captured)
+            try:
+                payload = pickle.dumps(("ok", result))
+            except Exception:
+                payload = pickle.dumps(("ok", {
+                    "type": result.get("type"), "value": str(result["value"]), "chart": result["chart"]
+                }))
+            conn.send_bytes(payload)
+        except BaseException as e:
+            if kind == "load":
+                continue
+            conn.send_bytes(pickle.dumps(("error", f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.lock = threading.Lock()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class CodeExecutionPool:
+    """Pre-warmed worker processes that run generated code off the script thread.
+
+    Each worker loads the published dataframe once (memory-mapped Arrow, so
+    the pages are shared with the other workers) and runs code against it
+    under a memory limit. A task that exceeds the wall-clock timeout has its
+    worker killed and replaced, so a runaway query never blocks the server.
+    """
+
+    def __init__(self, size=None, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+        self.size = size or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        # spawn: forking a process that runs Streamlit's threads is unsafe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._idle = queue.Queue()
+        self._published = {}
+        self._lock = threading.Lock()
+        for _ in range(self.size):
+            self._add_worker()
+
+    def _add_worker(self):
+        worker = _Worker(self._ctx, self.memory_limit_mb)
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+        return worker
+
+    def _replace_worker(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers.remove(worker)
+        self._add_worker()
+
+    def _publish(self, df, version):
+        with self._lock:
+            path = self._published.get(version)
+            if path is not None:
+                return path
+            path = publish_dataframe(df, version)
+            self._published[version] = path
+            workers = list(self._workers)
+        # Pre-load the new data in every worker so the first query doesn't pay for it
+        for worker in workers:
+            with worker.lock:
+                try:
+                    worker.conn.send(("load", path))
+                except (OSError, ValueError):
+                    pass
+        return path
+
+    def execute(self, code, df, version, timeout=None):
+        """Run code against df in a worker and return its result dict.
+
+        The dict has an extra "chart" key with the PNG bytes of the chart
+        the code saved, or None.
+        """
+        path = self._publish(df, version)
+        timeout = self.timeout if timeout is None else timeout
+
+        worker = self._idle.get()
+        try:
+            with worker.lock:
+                worker.conn.send(("run", path, code))
+            finished = worker.conn.poll(timeout)
+            if finished:
+                status, payload = pickle.loads(worker.conn.recv_bytes())
+        except (EOFError, OSError):
+            self._replace_worker(worker)
+            raise CodeExecutionCrashed("Procesul care rula codul generat s-a oprit (limită de memorie?)")
+
+        if not finished:
+            self._replace_worker(worker)
+            raise CodeExecutionTimeout(f"Codul generat a depășit limita de {timeout:.0f}s")
+        self._idle.put(worker)
+
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_execution_pool():
+    """Return the process-wide code execution pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = os.environ.get("CODE_EXEC_WORKERS")
+            _pool = CodeExecutionPool(
+                size=int(workers) if workers else None,
+                timeout=float(os.environ.get("CODE_EXEC_TIMEOUT", DEFAULT_TIMEOUT_SECONDS)),
+                memory_limit_mb=int(os.environ.get("CODE_EXEC_MEMORY_MB", DEFAULT_MEMORY_LIMIT_MB)),
+            )
+        return _pool
+
+
+def run_in_pool(code, df, version):
+    """Execute generated code in the worker pool"""
+    return get_execution_pool().execute(code, df, version)
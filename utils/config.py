@@ -1,4 +1,12 @@
+import hashlib
 import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pandas as pd
 from openai import OpenAI
 try:
     from pandasai import Agent
@@ -6,30 +14,212 @@ try:
 except ImportError:
     from pandasai import SmartDataframe
     from pandasai.llm.base import BaseOpenAI
+from utils.code_executor import run_in_pool, with_imports
+from utils.data_loader import get_dataset_version
+from utils.http_pool import get_http_client
+from utils.llm_cache import LLMResponseCache, get_llm_cache
+from utils.memory_policy import MemoryPolicy, count_message_tokens
+from utils.prompt_context import build_dataframe_connector
+from utils.responses import ChartResponseParser
+from utils.resilience import (
+    backoff_delay, get_breaker, get_latency_tracker, get_ttft_tracker, is_retryable, retry_after_seconds
+)
+from utils.scheduler import QueueTimeout, get_scheduler, get_session_id, get_session_weight, key_id_for
+from utils.singleflight import get_inflight_registry
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+REQUEST_DEADLINE_SECONDS = 90.0
+DEFAULT_HEDGE_DELAY_SECONDS = 5.0
+# A fixed hedge delay; unset, hedging waits for the primary model's p90
+# time to first token
+HEDGE_DELAY_SECONDS = float(os.environ["LLM_HEDGE_DELAY"]) if os.environ.get("LLM_HEDGE_DELAY") else None
+PROMPT_TOKEN_HISTORY_SIZE = 500
+
+MODEL_OPTIONS = {
+    "Qwen2.5 72B Instruct": "qwen/qwen-2.5-72b-instruct:free",
+    "Meta: Llama 3.3 70B Instruct": "meta-llama/llama-3.3-70b-instruct:free"
+}
+
+# "plotly": charts come back as figure specs rendered in the browser;
+# "matplotlib": charts are rasterised to PNG by the code workers
+CHART_BACKEND = os.environ.get("CHART_BACKEND", "plotly").lower()
+PLOTLY_CHART_INSTRUCTIONS = (
+    "When asked for a chart, build it with plotly (plotly.express or plotly.graph_objects). "
+    "Use one trace per country named after the country. Do not save it to a file and do "
+    "not call fig.show(); return the figure object itself: "
+    'result = {"type": "plot", "value": fig}.'
+)
+
+# Added when the data has categorical columns (see data_loader.compact_dtypes)
+CATEGORICAL_INSTRUCTIONS = (
+    "Categorical columns (such as Country) are pandas Categoricals: pass observed=True "
+    "to groupby so filtered-out categories do not show up as empty groups."
+)
+
+KEY_VALIDATION_TTL_SECONDS = float(os.environ.get("OPENROUTER_KEY_CACHE_TTL", 15 * 60))
+KEY_REJECTION_TTL_SECONDS = 60.0
+
+# Process-wide cache of API key validation results: salted hash -> (expires, ok, message)
+_KEY_CACHE_SALT = secrets.token_bytes(16)
+_key_cache = {}
+_key_cache_lock = threading.Lock()
+
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://pandasai-app.com",
+    "X-Title": "PandasAI App",
+}
+
+def get_openrouter_client(api_key):
+    """Create an OpenRouter client that reuses the shared connection pool"""
+    # The OpenAI wrapper is cheap; the pooled HTTP client underneath it is what
+    # holds the connections, so it is shared across all keys and sessions
+    return OpenAI(
+        base_url=OPENROUTER_BASE_URL,
+        api_key=api_key,
+        http_client=get_http_client(),
+        # Retries are handled by OpenRouterLLM, which also fails over between models
+        max_retries=0,
+    )
+
+def _wrap_response(content, usage=None):
+    """Wrap plain text in the minimal shape of an OpenAI chat completion"""
+    message = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+def _stream_tokens(stream, on_usage=None):
+    """Yield the text of a streamed completion, closing the stream when done.
+
+    on_usage receives the token usage the provider reports in the last chunk.
+    """
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None and on_usage is not None:
+                on_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+    finally:
+        stream.close()
+
+class _HedgeLeg:
+    """One streaming request of a hedged call, running on its own thread"""
+    
+    def __init__(self, llm, model, messages, max_tokens, temperature, changed):
+        self.model = model
+        self.tokens = []
+        self.usage = None
+        self.error = None
+        self.done = False
+        self._changed = changed
+        self._cancelled = threading.Event()
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        self._started = time.monotonic()
+        self._args = (llm, messages, max_tokens, temperature)
+        # The leg's thread queues on behalf of the session that made the call
+        self._session = (get_session_id(), get_session_weight())
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def _run(self):
+        llm, messages, max_tokens, temperature = self._args
+        breaker = get_breaker(self.model)
+        session_id, weight = self._session
+        try:
+            # A leg cancelled while still queued leaves without using a key token
+            with get_scheduler().slot(llm._key_id, session_id=session_id, weight=weight,
+                                      timeout=llm.request_deadline, cancelled=self._cancelled):
+                self._started = time.monotonic()
+                with self._stream_lock:
+                    if self._cancelled.is_set():
+                        return
+                    self._stream = llm.open_stream(messages, max_tokens, temperature, model=self.model)
+                for token in _stream_tokens(self._stream, on_usage=self._set_usage):
+                    if self._cancelled.is_set():
+                        # Tokens already buffered before cancel() closed the stream
+                        break
+                    with self._changed:
+                        if not self.tokens:
+                            get_ttft_tracker(self.model).record(time.monotonic() - self._started)
+                        self.tokens.append(token)
+                        self._changed.notify_all()
+            if not self._cancelled.is_set():
+                get_latency_tracker(self.model).record(time.monotonic() - self._started)
+                breaker.record_success()
+        except Exception as e:
+            if self._cancelled.is_set():
+                # The stream was closed under us by cancel()
+                return
+            self.error = e
+            if is_retryable(e):
+                breaker.record_failure()
+        finally:
+            with self._changed:
+                self.done = True
+                self._changed.notify_all()
+    
+    def _set_usage(self, usage):
+        self.usage = usage
+    
+    def has_output(self):
+        return bool(self.tokens) or (self.done and self.error is None)
+    
+    def failed(self):
+        return self.done and self.error is not None
+    
+    def cancel(self):
+        """Stop the leg, closing its upstream stream so the connection is freed now"""
+        with self._stream_lock:
+            self._cancelled.set()
+            stream = self._stream
+        if stream is not None:
+            stream.close()
+        else:
+            get_scheduler().wake()
 
 # Custom OpenRouter LLM class for PandasAI
 class OpenRouterLLM(BaseOpenAI):
-    def __init__(self, api_token, model="meta-llama/llama-3.3-70b-instruct:free"):
+    def __init__(self, api_token, model="meta-llama/llama-3.3-70b-instruct:free",
+                 dataset_version=None, use_cache=True, hedging=False, hedge_delay=None,
+                 memory_policy=None):
         # Initialize parent class without parameters
         super().__init__()
         
         # Set required attributes
         self.api_token = api_token
+        # Rate limits are per key; the scheduler only ever sees this hash
+        self._key_id = key_id_for(api_token)
         self.model = model
         self._is_chat_model = True
         self._max_retries = 3
         
-        # Create OpenRouter client
-        self.openai_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_token,
-        )
+        # Resilience: a hard deadline per request and the other configured
+        # models as fallbacks when the selected one is rate limited or down
+        self.request_deadline = REQUEST_DEADLINE_SECONDS
+        self.fallback_models = [m for m in MODEL_OPTIONS.values() if m != model]
+        
+        # Hedging: race a slow request against the alternate model
+        self.hedging = hedging
+        self.hedge_delay = hedge_delay if hedge_delay is not None else HEDGE_DELAY_SECONDS
+        
+        # Responses are only valid for the data they were generated against
+        self.dataset_version = dataset_version
+        self.response_cache = get_llm_cache() if use_cache else None
+        self._stream_state = threading.local()
+        
+        # Conversation history sent with each prompt is bounded by this policy
+        self.memory_policy = memory_policy
+        self.prompt_token_history = deque(maxlen=PROMPT_TOKEN_HISTORY_SIZE)
+        self._call_state = threading.local()
+        
+        # Create OpenRouter client on top of the process-wide connection pool
+        self.openai_client = get_openrouter_client(api_token)
         
         # Create a mock client object that PandasAI expects
         class MockClient:
-            def __init__(self, openai_client, model):
-                self.openai_client = openai_client
-                self.model = model
+            def __init__(self, llm):
+                self.llm = llm
             
             def create(self, **kwargs):
                 # Convert PandasAI parameters to OpenAI format
@@ -37,29 +227,314 @@ class OpenRouterLLM(BaseOpenAI):
                 max_tokens = kwargs.get('max_tokens', 1000)
                 temperature = kwargs.get('temperature', 0)
                 
-                response = self.openai_client.chat.completions.create(
-                    extra_headers={
-                        "HTTP-Referer": "https://pandasai-app.com",
-                        "X-Title": "PandasAI App",
-                    },
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=temperature
-                )
-                return response
-        
-        self.client = MockClient(self.openai_client, self.model)
+                content = self.llm._complete(messages, max_tokens, temperature)
+                return _wrap_response(content, self.llm.last_usage)
+        
+        self.client = MockClient(self)
+    
+    def _complete(self, messages, max_tokens=1000, temperature=0):
+        """Run a chat completion, serving deterministic requests from the cache"""
+        if self.memory_policy is not None:
+            messages = self.memory_policy.apply(messages)
+        # An estimate until the provider reports the prompt's actual size;
+        # cached and coalesced answers keep it (they made no upstream call)
+        self._call_state.prompt_tokens = count_message_tokens(messages)
+        self._call_state.usage = None
+        
+        request_key = LLMResponseCache.make_key(
+            self.model, messages, temperature, max_tokens, self.dataset_version
+        )
+        callback = self.get_stream_callback()
+        
+        # Only temperature 0 answers are reproducible enough to be reused
+        use_cache = self.response_cache is not None and not temperature
+        if use_cache:
+            cached = self.response_cache.get(request_key)
+            if cached is not None:
+                if callback is not None:
+                    callback(cached)
+                return cached
+        
+        # Identical requests already in flight from other sessions share one
+        # upstream call instead of each hitting OpenRouter. Only calls made
+        # with the same API key are coalesced: each user pays for (and sees
+        # the errors of) their own key
+        content, shared = get_inflight_registry().do(
+            (self._key_id, request_key),
+            lambda: self._request(messages, max_tokens, temperature)
+        )
+        if shared:
+            if callback is not None:
+                callback(content)
+            return content
+        
+        if use_cache and content:
+            self.response_cache.set(request_key, content)
+        return content
+    
+    def _request(self, messages, max_tokens, temperature):
+        """Send the request upstream, hedged across models when enabled"""
+        if self.hedging:
+            alternate = self._hedge_model()
+            breaker = get_breaker(self.model)
+            # With the selected model's circuit open there is nothing to hedge:
+            # the retry path goes straight to the fallback models
+            if alternate is not None and breaker.allow():
+                try:
+                    return self._hedged_request(alternate, messages, max_tokens, temperature)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                finally:
+                    # A half-open trial whose leg was cancelled or cut off by
+                    # the deadline never records an outcome
+                    breaker.release_trial()
+        return self._request_with_retries(messages, max_tokens, temperature)
+    
+    def _hedge_model(self):
+        """Return the first fallback model that is currently healthy"""
+        for model in self.fallback_models:
+            if get_breaker(model).state == "closed":
+                return model
+        return None
+    
+    def hedge_threshold(self):
+        """Seconds to wait for the primary model's first token before hedging"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        p90 = get_ttft_tracker(self.model).percentile(90)
+        return p90 if p90 is not None else DEFAULT_HEDGE_DELAY_SECONDS
+    
+    def _hedged_request(self, alternate, messages, max_tokens, temperature):
+        """Race the selected model against an alternate one.
+        
+        The alternate request is only sent if the selected model has not
+        produced its first token within hedge_threshold(). The first request
+        to start answering wins and the other one is cancelled by closing its
+        stream.
+        """
+        deadline = time.monotonic() + self.request_deadline
+        changed = threading.Condition()
+        legs = [_HedgeLeg(self, self.model, messages, max_tokens, temperature, changed)]
+        hedge_at = time.monotonic() + self.hedge_threshold()
+        
+        winner = None
+        with changed:
+            while winner is None:
+                winner = next((leg for leg in legs if leg.has_output()), None)
+                if winner is not None:
+                    break
+                
+                now = time.monotonic()
+                if now >= deadline:
+                    for leg in legs:
+                        leg.cancel()
+                    raise TimeoutError(
+                        f"OpenRouter request exceeded {self.request_deadline:.0f}s deadline"
+                    )
+                
+                if len(legs) == 1 and (now >= hedge_at or legs[0].failed()):
+                    legs.append(_HedgeLeg(self, alternate, messages, max_tokens, temperature, changed))
+                    continue
+                
+                if all(leg.failed() for leg in legs):
+                    raise legs[-1].error
+                
+                wait_until = hedge_at if len(legs) == 1 else deadline
+                changed.wait(timeout=max(0.01, wait_until - now))
+        
+        for leg in legs:
+            if leg is not winner:
+                leg.cancel()
+        
+        # Forward the winner's tokens from this (the Streamlit script) thread,
+        # without holding the lock so the stream keeps filling meanwhile
+        callback = self.get_stream_callback()
+        sent = 0
+        while True:
+            with changed:
+                while len(winner.tokens) == sent and not winner.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        winner.cancel()
+                        raise TimeoutError(
+                            f"OpenRouter request exceeded {self.request_deadline:.0f}s deadline"
+                        )
+                    changed.wait(timeout=remaining)
+                tokens = winner.tokens[sent:]
+                finished = winner.done
+            
+            sent += len(tokens)
+            if callback is not None:
+                for token in tokens:
+                    callback(token)
+            if finished:
+                break
+        
+        if winner.error is not None:
+            raise winner.error
+        self._record_usage(winner.usage)
+        return "".join(winner.tokens)
+    
+    def _request_with_retries(self, messages, max_tokens, temperature):
+        """Send the request upstream with retries, deadline and model fallback"""
+        deadline = time.monotonic() + self.request_deadline
+        last_error = None
+        
+        for model in [self.model] + self.fallback_models:
+            breaker = get_breaker(model)
+            if not breaker.allow():
+                continue
+            
+            try:
+                for attempt in range(self._max_retries):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"OpenRouter request exceeded {self.request_deadline:.0f}s deadline"
+                        ) from last_error
+                    
+                    # A failed hedge or attempt may have streamed part of an answer
+                    self._restart_stream()
+                    try:
+                        # Each attempt waits for its own fair share of upstream
+                        # capacity; the slot is released before any retry delay
+                        with get_scheduler().slot(self._key_id, timeout=remaining):
+                            content = self._request_model(
+                                model, messages, max_tokens, temperature,
+                                max(0.0, deadline - time.monotonic())
+                            )
+                    except QueueTimeout:
+                        # Waiting in the queue says nothing about the model
+                        raise
+                    except Exception as e:
+                        if not is_retryable(e):
+                            # The model answered; the request itself was bad
+                            breaker.record_success()
+                            raise
+                        last_error = e
+                        breaker.record_failure()
+                        if not breaker.allow():
+                            # This model is degraded, move on to the next one
+                            break
+                        delay = backoff_delay(attempt, retry_after=retry_after_seconds(e))
+                        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                        continue
+                    
+                    breaker.record_success()
+                    return content
+            finally:
+                # A half-open trial cut short by the deadline or an interruption
+                # must not keep the model's circuit half-open forever
+                breaker.release_trial()
+        
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("All OpenRouter models are temporarily unavailable")
+    
+    def _request_model(self, model, messages, max_tokens, temperature, timeout):
+        """Send a single request to one model, streaming it when a token callback is set"""
+        callback = self.get_stream_callback()
+        started = time.monotonic()
+        if callback is None:
+            response = self.openai_client.chat.completions.create(
+                extra_headers=OPENROUTER_HEADERS,
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=timeout
+            )
+            get_latency_tracker(model).record(time.monotonic() - started)
+            self._record_usage(response.usage)
+            return response.choices[0].message.content
+        
+        # Callers that need the whole text (code generation) still get it,
+        # but the user sees every token as soon as it arrives
+        parts = []
+        stream = self.open_stream(messages, max_tokens, temperature, model=model, timeout=timeout)
+        for token in _stream_tokens(stream, on_usage=self._record_usage):
+            if not parts:
+                get_ttft_tracker(model).record(time.monotonic() - started)
+            parts.append(token)
+            callback(token)
+        get_latency_tracker(model).record(time.monotonic() - started)
+        return "".join(parts)
+    
+    def open_stream(self, messages, max_tokens=1000, temperature=0, model=None, timeout=None):
+        """Start a streamed completion; closing the returned stream aborts it"""
+        return self.openai_client.chat.completions.create(
+            extra_headers=OPENROUTER_HEADERS,
+            model=model or self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            # The last chunk then carries the token usage of the request
+            stream_options={"include_usage": True},
+            timeout=timeout or self.request_deadline
+        )
+    
+    @contextmanager
+    def streaming(self, callback, on_restart=None):
+        """Forward generated tokens to callback for the duration of the block.
+        
+        on_restart is called when a retry or fallback starts the answer over,
+        so tokens already shown from the failed attempt can be discarded.
+        """
+        # Stored per thread so concurrent sessions sharing this LLM don't
+        # receive each other's tokens
+        previous = self.get_stream_callback(), getattr(self._stream_state, "on_restart", None)
+        self._stream_state.callback = callback
+        self._stream_state.on_restart = on_restart
+        try:
+            yield
+        finally:
+            self._stream_state.callback, self._stream_state.on_restart = previous
+    
+    def get_stream_callback(self):
+        return getattr(self._stream_state, "callback", None)
+    
+    def _restart_stream(self):
+        on_restart = getattr(self._stream_state, "on_restart", None)
+        if on_restart is not None:
+            on_restart()
+    
+    def _record_usage(self, usage):
+        """Keep the token usage the provider reported for an upstream call"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens is None:
+            return
+        self._call_state.usage = usage
+        self._call_state.prompt_tokens = prompt_tokens
+        self.prompt_token_history.append(prompt_tokens)
+    
+    @property
+    def last_prompt_tokens(self):
+        """Prompt size of the last call made from this thread (estimated if not reported)"""
+        return getattr(self._call_state, "prompt_tokens", None)
+    
+    @property
+    def last_usage(self):
+        """Token usage reported for the last upstream call made from this thread, or None"""
+        return getattr(self._call_state, "usage", None)
+    
+    def prompt_token_stats(self):
+        """Summary of the prompt sizes reported for recent upstream calls"""
+        history = list(self.prompt_token_history)
+        if not history:
+            return None
+        return {
+            "calls": len(history),
+            "last": history[-1],
+            "avg": sum(history) / len(history),
+            "max": max(history),
+        }
     
     def _generate_text(self, prompt: str) -> str:
         try:
-            response = self.openai_client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "https://pandasai-app.com",
-                    "X-Title": "PandasAI App",
-                },
-                model=self.model,
-                messages=[
+            return self._complete(
+                [
                     {
                         "role": "user",
                         "content": prompt
@@ -68,7 +543,6 @@ class OpenRouterLLM(BaseOpenAI):
                 max_tokens=1000,
                 temperature=0
             )
-            return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenRouter API error: {str(e)}")
     
@@ -76,47 +550,111 @@ class OpenRouterLLM(BaseOpenAI):
     def type(self) -> str:
         return "openrouter"
 
-def get_agent(df, api_key, model="qwen/qwen-2.5-72b-instruct:free"):
-    """Create and return a PandasAI agent"""
-    llm = OpenRouterLLM(
-        api_token=api_key,
-        model=model
-    )
+def build_agent(data, llm):
+    """Create a PandasAI agent over data (a dataframe or connector) using llm"""
+    memory_size = llm.memory_policy.memory_size if llm.memory_policy else 10
     
-    # Disable cache to avoid DuckDB lock issues with multiple Streamlit sessions
-    agent = Agent(df, config={
+    # Disable PandasAI's DuckDB cache (it locks up with multiple Streamlit sessions);
+    # responses are cached by OpenRouterLLM in a WAL-mode SQLite store instead
+    # Charts come back in memory with each response (see code_executor), so
+    # PandasAI must not try to open or save them as files
+    config = {
         "llm": llm, 
         "verbose": True,
-        "enable_cache": False
-    })
+        "enable_cache": False,
+        "open_charts": False,
+        "response_parser": ChartResponseParser
+    }
+    description = None
+    if CHART_BACKEND == "plotly":
+        config["data_viz_library"] = "plotly"
+        description = PLOTLY_CHART_INSTRUCTIONS
+    df = getattr(data, "pandas_df", data)
+    if any(isinstance(dtype, pd.CategoricalDtype) for dtype in getattr(df, "dtypes", [])):
+        description = " ".join(filter(None, [description, CATEGORICAL_INSTRUCTIONS]))
+    agent = Agent(data, config=config, memory_size=memory_size, description=description)
+    _use_execution_pool(agent, data, llm.dataset_version)
     return agent
 
+def _use_execution_pool(agent, data, dataset_version):
+    """Run the agent's generated code in the worker process pool.
+
+    Only the exec step is replaced, so PandasAI keeps validating results and
+    retrying failed code with its error correction framework.
+    """
+    try:
+        from pandasai.pipelines.chat.code_execution import CodeExecution
+    except ImportError:
+        return
+    df = getattr(data, "pandas_df", data)
+    version = dataset_version or get_dataset_version(df)
+    pipeline = getattr(getattr(agent, "pipeline", None), "code_execution_pipeline", None)
+    for step in getattr(pipeline, "_steps", []):
+        if isinstance(step, CodeExecution):
+            step.execute_code = _pooled_execute_code(agent, step, df, version)
+
+def _pooled_execute_code(agent, step, df, version):
+    def execute_code(code, context):
+        # PandasAI strips the import lines from cleaned code and keeps them as
+        # dependencies; put them back so the code runs on its own in a worker
+        code = with_imports(code, step._additional_dependencies)
+        agent.last_runnable_code = code
+        return run_in_pool(code, df, version)
+    return execute_code
+
+def get_agent(df, api_key, model="qwen/qwen-2.5-72b-instruct:free", hedging=False):
+    """Create and return a PandasAI agent"""
+    llm = OpenRouterLLM(
+        api_token=api_key,
+        model=model,
+        dataset_version=get_dataset_version(df),
+        hedging=hedging,
+        memory_policy=MemoryPolicy.from_env()
+    )
+    return build_agent(build_dataframe_connector(df), llm)
+
+def get_agent_llm(agent):
+    """Return the OpenRouterLLM instance used by a PandasAI agent"""
+    context = getattr(agent, "context", None)
+    config = context.config if context is not None else agent.config
+    return config.llm
+
+def _key_cache_id(api_key):
+    """Hash the key with a per-process salt so raw keys are never kept in memory"""
+    return hashlib.sha256(_KEY_CACHE_SALT + api_key.encode("utf-8")).hexdigest()
+
 def test_openrouter_connection(api_key):
     """Test OpenRouter connection"""
+    # Validation results are shared by all sessions and pages of this process,
+    # so re-validating a known key costs nothing
+    cache_id = _key_cache_id(api_key)
+    with _key_cache_lock:
+        cached = _key_cache.get(cache_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+    
     try:
-        openrouter_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
+        # Authenticated metadata call: checks the key without spending a
+        # (rate limited) chat completion
+        response = get_http_client().get(
+            f"{OPENROUTER_BASE_URL}/key",
+            headers={"Authorization": f"Bearer {api_key}", **OPENROUTER_HEADERS},
+            timeout=10.0
         )
-        
-        test_completion = openrouter_client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://pandasai-app.com",
-                "X-Title": "PandasAI App",
-            },
-            model="qwen/qwen-2.5-72b-instruct:free",
-            messages=[
-                {
-                    "role": "user",
-                    "content": "Hello! Just testing the connection. Please respond with 'Connection successful!'"
-                }
-            ],
-            max_tokens=50
-        )
-        # Ensure the response is properly encoded
-        response_content = test_completion.choices[0].message.content
-        return True, response_content.encode('utf-8', errors='ignore').decode('utf-8')
+        if response.status_code == 200:
+            result = (True, "Connection successful!")
+            ttl = KEY_VALIDATION_TTL_SECONDS
+        elif response.status_code in (401, 403):
+            result = (False, f"Error code: {response.status_code} - API key rejected by OpenRouter")
+            ttl = KEY_REJECTION_TTL_SECONDS
+        else:
+            # Upstream trouble says nothing about the key, so don't cache it
+            return False, f"Error code: {response.status_code} - {response.text[:200]}"
     except Exception as e:
         # Ensure error message is properly encoded
         error_msg = str(e).encode('utf-8', errors='ignore').decode('utf-8')
         return False, error_msg
+    
+    with _key_cache_lock:
+        _key_cache[cache_id] = (time.monotonic() + ttl, result[0], result[1])
+    return result
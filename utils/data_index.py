@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.frame_registry import frame_info
+
+MAX_INDEXES = 4
+
+
+class CountryYearIndex:
+    """Sorted (Country, Year) index over a dataframe's row positions.
+
+    Rows are ordered by country, then year, once; each country is then a
+    contiguous block and a year range within it is found by binary search.
+    Selecting a set of countries over a year range costs
+    O(countries * log(rows) + selected rows) instead of scanning the table.
+    The dataframe itself is never reordered or copied.
+    """
+
+    def __init__(self, df, country_column="Country", year_column="Year"):
+        codes, uniques = pd.factorize(df[country_column], sort=False)
+        years = df[year_column].to_numpy()
+        order = np.lexsort((years, codes))
+        # Data already grouped by country with ascending years needs no permutation
+        self._order = None if np.array_equal(order, np.arange(len(order))) else order
+        sorted_codes = codes[order]
+        self._years = years[order]
+
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(order) else []
+        ends = list(starts[1:]) + [len(order)]
+        self._blocks = {}
+        for start, end in zip(starts, ends):
+            code = sorted_codes[start]
+            # factorize marks missing countries with -1
+            self._blocks[uniques[code] if code >= 0 else None] = (int(start), int(end))
+
+    def positions(self, countries=None, years=None):
+        """Row positions for the countries (None: all) within years, in table order"""
+        keys = self._blocks.keys() if countries is None else [c for c in countries if c in self._blocks]
+        ranges = []
+        for key in keys:
+            start, end = self._blocks[key]
+            if years is not None:
+                block = self._years[start:end]
+                start, end = (
+                    start + int(np.searchsorted(block, years[0], side="left")),
+                    start + int(np.searchsorted(block, years[1], side="right")),
+                )
+            if end > start:
+                ranges.append((start, end))
+
+        if not ranges:
+            return np.empty(0, dtype=np.intp)
+        if self._order is None:
+            positions = np.concatenate([np.arange(start, end) for start, end in ranges])
+        else:
+            positions = np.concatenate([self._order[start:end] for start, end in ranges])
+        # Keep the table's row order, like a boolean mask would
+        positions.sort()
+        return positions
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_data_index(df):
+    """Return the shared index for a loaded dataset, or None for other frames.
+
+    Only the exact frames load_data() returned are indexed: a sorted,
+    filtered or otherwise derived frame has other row positions (even with
+    the same shape), and building an index for a one-off frame costs more
+    than a scan.
+    """
+    info = frame_info(df)
+    version = info.get("dataset_version") if info is not None else None
+    if version is None or "Country" not in df.columns or "Year" not in df.columns:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(version)
+        if index is not None:
+            _indexes.move_to_end(version)
+            return index
+
+    index = CountryYearIndex(df)
+    with _indexes_lock:
+        _indexes[version] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def select_rows(df, countries=None, years=None):
+    """Rows of df for the given countries (None: all) and inclusive year range (None: all).
+
+    Uses the (Country, Year) index when df is a loaded dataset and falls
+    back to boolean masks otherwise.
+    """
+    if countries is None and years is None:
+        return df.copy(deep=False)
+
+    index = get_data_index(df)
+    if index is not None:
+        return df.take(index.positions(countries, years))
+
+    mask = pd.Series(True, index=df.index)
+    if countries is not None:
+        mask &= df["Country"].isin(countries)
+    if years is not None:
+        mask &= (df["Year"] >= years[0]) & (df["Year"] <= years[1])
+    return df[mask]
@@ -1,19 +1,188 @@
+import hashlib
+import os
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-@st.cache_data
-def load_data():
-    """Load and prepare the economic data"""
-    df = pd.read_csv('digi.csv')
-    
-    # Convert columns with mixed types to float
-    numeric_columns = ['GDP', 'FDI', 'IU', 'MCS', 'PA', 'EF']
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
+from utils.data_index import select_rows
+from utils.frame_registry import frame_info, register_frame
+
+DATA_PATH = "digi.csv"
+DATA_CACHE_DIR = os.path.join("cache", "data")
+NUMERIC_COLUMNS = ['GDP', 'FDI', 'IU', 'MCS', 'PA', 'EF']
+# Bump when the CSV conversion changes so older cache files are rebuilt
+CACHE_FORMAT_VERSION = 5
+# Categorical keys, int32 years and downcast numerics for the exploration
+# pages (COMPACT_DTYPES=1); PandasAI always gets the CSV's types
+COMPACT_DTYPES = os.environ.get("COMPACT_DTYPES", "0") == "1"
+
+def _source_fingerprint(path):
+    """Identify a version of the source file by its path, mtime and size"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{CACHE_FORMAT_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def _read_csv(path):
+    """Parse the CSV with an explicit schema"""
+    # Year is parsed freely: a blank cell can't be read as int64
+    dtypes = {"Country": "object", "Year": "object"}
+    try:
+        df = pd.read_csv(path, dtype={**dtypes, **{col: "float64" for col in NUMERIC_COLUMNS}})
+    except ValueError:
+        # Some indicator holds non-numeric markers: parse as text, then coerce
+        df = pd.read_csv(path, dtype={**dtypes, **{col: "object" for col in NUMERIC_COLUMNS}})
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+    # Rows without a usable year can't be placed on any time axis
+    years = pd.to_numeric(df["Year"], errors='coerce')
+    df = df[years.notna()].reset_index(drop=True)
+    df["Year"] = years[years.notna()].to_numpy().astype("int64")
+    return df
+
+def _compact_column(series, kind):
+    if kind == "categorical":
+        return series.astype("category")
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series
+    values = series.to_numpy()
+    if pd.api.types.is_integer_dtype(series) or (
+        not np.isnan(values).any() and np.array_equal(values, np.round(values))
+    ):
+        # Integers and whole numbers stored as floats (e.g. years); never
+        # narrower than int32, so arithmetic on them (Year * 100) can't overflow
+        compact = pd.to_numeric(series, downcast="integer")
+        return compact.astype(np.int32) if compact.dtype.itemsize < 4 else compact
+    if kind == "numeric" and np.array_equal(values.astype(np.float32), values, equal_nan=True):
+        return series.astype(np.float32)
+    return series
+
+def compact_dtypes(df, column_info=None):
+    """Return df with a compact schema driven by get_column_info() types.
+
+    categorical columns become pandas Categoricals, integer ones the
+    smallest integer type of at least 32 bits, and numeric ones are downcast
+    only where no value changes. The memory footprint in bytes before and
+    after is recorded in attrs["memory_footprint"].
+    """
+    column_info = column_info or get_column_info()
+    before = int(df.memory_usage(deep=True).sum())
+    compact = pd.DataFrame({
+        col: _compact_column(df[col], column_info[col]["type"]) if col in column_info else df[col]
+        for col in df.columns
+    })
+    compact.attrs["memory_footprint"] = (before, int(compact.memory_usage(deep=True).sum()))
+    return compact
+
+def _write_columnar(df, path, version):
+    """Write df as uncompressed Arrow IPC (or a pickle without pyarrow)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if path.endswith(".arrow"):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Keep NaN as NaN rather than a null bitmap so float columns can be
+        # handed out straight from the memory map
+        for i, name in enumerate(table.column_names):
+            if pd.api.types.is_float_dtype(df[name]):
+                table = table.set_column(i, name, pa.array(df[name].to_numpy(), from_pandas=False))
+        metadata = {**(table.schema.metadata or {}), b"dataset_version": version.encode("utf-8")}
+        if "memory_footprint" in df.attrs:
+            metadata[b"memory_footprint"] = ",".join(map(str, df.attrs["memory_footprint"])).encode("utf-8")
+        # One record batch: columns split over batches would be concatenated (copied) on load
+        feather.write_feather(table.replace_schema_metadata(metadata), tmp_path,
+                              compression="uncompressed", chunksize=max(len(df), 1))
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+def _read_columnar(path):
+    if path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+        # split_blocks avoids consolidating columns into new arrays, so numeric
+        # columns stay read-only views of the file shared by every process
+        df = table.to_pandas(split_blocks=True)
+        metadata = table.schema.metadata or {}
+        if b"memory_footprint" in metadata:
+            df.attrs["memory_footprint"] = tuple(int(n) for n in metadata[b"memory_footprint"].split(b","))
+        version = metadata[b"dataset_version"].decode("utf-8") if b"dataset_version" in metadata else None
+        # Indexes and caches are tied to this very object, never to frames derived from it
+        register_frame(df, dataset_version=version or get_dataset_version(df),
+                       columnar_path=os.path.abspath(path))
+        return df
+    df = pd.read_pickle(path)
+    register_frame(df, dataset_version=get_dataset_version(df), columnar_path=None)
     return df
 
+def load_columnar(path=DATA_PATH, cache_dir=DATA_CACHE_DIR, compact=COMPACT_DTYPES):
+    """Load the dataset from its columnar cache, converting the CSV once.
+
+    The cache file is keyed by the CSV's path, mtime and size, so editing
+    the CSV rebuilds it on the next load; stale cache files are removed.
+    With compact, the cached frame uses compact_dtypes().
+    """
+    try:
+        import pyarrow  # noqa: F401
+        extension = "arrow"
+    except ImportError:
+        extension = "pkl"
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    fingerprint = _source_fingerprint(path)
+    cache_name = f"{stem}-{fingerprint}{'-compact' if compact else ''}"
+    cache_path = os.path.join(cache_dir, f"{cache_name}.{extension}")
+    if os.path.exists(cache_path):
+        try:
+            return _read_columnar(cache_path)
+        except Exception:
+            pass  # unreadable (partial or foreign) cache file: rebuild it
+
+    df = _read_csv(path)
+    if compact:
+        df = compact_dtypes(df)
+    version = get_dataset_version(df)
+    _write_columnar(df, cache_path, version)
+    for name in os.listdir(cache_dir):
+        # Older versions of the CSV; its compact and plain caches both stay
+        if name.startswith(f"{stem}-") and not name.startswith(f"{stem}-{fingerprint}") and not name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    # Serve the mapped file from the start, like later loads
+    return _read_columnar(cache_path)
+
+@st.cache_resource
+def load_data():
+    """Load and prepare the economic data.
+
+    Every session gets the same dataframe, backed by the memory-mapped
+    columnar cache: treat it as read-only and copy before mutating.
+    """
+    return load_columnar()
+
+@st.cache_resource
+def load_agent_data():
+    """Load the dataset with the CSV's column types, for PandasAI.
+
+    Generated code (and the code workers running it) expects plain object,
+    int64 and float64 columns, so compact dtypes are never used here.
+    """
+    if not COMPACT_DTYPES:
+        return load_data()
+    return load_columnar(compact=False)
+
+def get_columnar_path(df):
+    """Return the memory-mappable file df was loaded from, or None.
+
+    Only the loaded frame itself has one: a frame derived from it holds
+    other data, even when its shape is the same.
+    """
+    info = frame_info(df)
+    return info.get("columnar_path") if info is not None else None
+
 def get_column_info():
     """Return information about dataset columns"""
     return {
@@ -76,19 +245,27 @@ def get_country_colors():
 
 def filter_data(df, countries=None, years=None, indicators=None):
     """Filter dataframe based on selections"""
-    filtered_df = df.copy()
-    
-    if countries:
-        filtered_df = filtered_df[filtered_df['Country'].isin(countries)]
-    
-    if years:
-        filtered_df = filtered_df[
-            (filtered_df['Year'] >= years[0]) & 
-            (filtered_df['Year'] <= years[1])
-        ]
+    # Rows come from the (Country, Year) index of the loaded dataset, without
+    # copying the whole frame first
+    filtered_df = select_rows(df, countries or None, years or None)
     
     if indicators:
         cols_to_keep = ['Country', 'Year'] + indicators
         filtered_df = filtered_df[cols_to_keep]
     
     return filtered_df
+
+def get_dataset_version(df):
+    """Return a short content hash identifying this version of the dataset"""
+    # The loaded frame carries the version computed when its cache file was
+    # written. Any other frame is hashed: attrs are copied onto derived frames
+    # (sorted, assigned, ...) and can't tell them from the original
+    info = frame_info(df)
+    if info is not None and info.get("dataset_version") is not None:
+        return info["dataset_version"]
+    
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    digest = hashlib.sha256(row_hashes.tobytes())
+    # Column types too: the same values as Categoricals call for other code
+    digest.update(",".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items()).encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,33 @@
+import threading
+import weakref
+
+_frames = {}
+_frames_lock = threading.Lock()
+
+
+def register_frame(df, **info):
+    """Attach info (dataset version, source file, ...) to this exact dataframe object.
+
+    Unlike df.attrs, which pandas copies onto every derived frame (sorted,
+    assigned, ...), the info is only ever returned for df itself, and only
+    while its shape and columns are the ones it was registered with.
+    """
+    key = id(df)
+
+    def forget(ref, key=key):
+        with _frames_lock:
+            entry = _frames.get(key)
+            if entry is not None and entry[0] is ref:
+                del _frames[key]
+
+    with _frames_lock:
+        _frames[key] = (weakref.ref(df, forget), (df.shape, tuple(df.columns)), dict(info))
+
+
+def frame_info(df):
+    """Return the info registered for df itself, or None for any other frame"""
+    with _frames_lock:
+        entry = _frames.get(id(df))
+    if entry is None or entry[0]() is not df or entry[1] != (df.shape, tuple(df.columns)):
+        return None
+    return entry[2]
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _http2_available():
+    """HTTP/2 in httpx needs the optional h2 package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client():
+    """Return the process-wide pooled HTTP client.
+
+    Every OpenRouterLLM (and the connection test) hands this client to its
+    OpenAI wrapper, so all sessions reuse the same keep-alive connections.
+    The client carries no credentials: each OpenAI wrapper adds its own
+    Authorization header to every request it sends.
+    """
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            limits = httpx.Limits(
+                max_connections=int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+                max_keepalive_connections=int(os.environ.get("OPENROUTER_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE)),
+                keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+            )
+            _client = httpx.Client(
+                limits=limits,
+                timeout=DEFAULT_TIMEOUT,
+                http2=_http2_available(),
+            )
+        return _client
@@ -0,0 +1,216 @@
+import hashlib
+import hmac
+import json
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOBS_PATH = os.path.join("cache", "jobs.sqlite")
+DEFAULT_OWNER_SECRET_PATH = os.path.join("cache", "owner_secret")
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+_owner_secret = None
+_owner_secret_lock = threading.Lock()
+
+
+def _get_owner_secret():
+    """Server-side key for owner ids: JOB_OWNER_SECRET, else one generated and kept in cache/"""
+    global _owner_secret
+    with _owner_secret_lock:
+        if _owner_secret is None:
+            configured = os.environ.get("JOB_OWNER_SECRET")
+            if configured:
+                _owner_secret = configured.encode("utf-8")
+            else:
+                path = os.environ.get("JOB_OWNER_SECRET_PATH", DEFAULT_OWNER_SECRET_PATH)
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                if not os.path.exists(path):
+                    # Written in full, then linked into place: concurrent
+                    # servers all end up with whichever file won
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(secrets.token_bytes(32))
+                    try:
+                        os.link(tmp_path, path)
+                    except FileExistsError:
+                        pass
+                    finally:
+                        os.remove(tmp_path)
+                with open(path, "rb") as f:
+                    _owner_secret = f.read()
+        return _owner_secret
+
+
+def get_owner_id(api_key):
+    """Stable owner id so a user finds their jobs again after a reload.
+
+    A keyed HMAC: without the server's secret, the ids in the jobs database
+    can't be used to test guesses of an API key.
+    """
+    return hmac.new(_get_owner_secret(), api_key.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+class JobQueue:
+    """Runs long queries in the background and keeps their results.
+
+    submit() returns a job id immediately; the work runs on a small thread
+    pool and the status, answer and chart of each job are stored in SQLite,
+    so results survive page navigation, reruns and reloads until they expire.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_PATH, max_workers=DEFAULT_MAX_WORKERS,
+                 retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                query TEXT NOT NULL,
+                status TEXT NOT NULL,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result BLOB,
+                chart BLOB,
+                figure TEXT,
+                error TEXT
+            )
+            """
+        )
+        try:
+            conn.execute("ALTER TABLE jobs ADD COLUMN figure TEXT")
+        except sqlite3.OperationalError:
+            pass  # already there
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, submitted_at)")
+        # Jobs of a previous server process will never finish
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Serverul a fost repornit înainte de finalizarea analizei.", time.time(), QUEUED, RUNNING),
+        )
+        conn.execute("DELETE FROM jobs WHERE submitted_at < ?", (time.time() - retention_seconds,))
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, owner, query, fn):
+        """Queue fn() as the answer to query and return the new job id"""
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO jobs (id, owner, query, status, submitted_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, owner, query, QUEUED, time.time()),
+        )
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id, fn):
+        conn = self._connection()
+        conn.execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+            (RUNNING, time.time(), job_id),
+        )
+        try:
+            response = fn()
+            # Keep the chart in its own column so listing jobs stays cheap to unpickle
+            value, chart = getattr(response, "value", response), getattr(response, "chart", None)
+            figure = getattr(response, "figure", None)
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, chart = ?, figure = ? WHERE id = ?",
+                (DONE, time.time(), pickle.dumps(value), chart,
+                 json.dumps(figure) if figure is not None else None, job_id),
+            )
+        except Exception as e:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (FAILED, time.time(), str(e), job_id),
+            )
+
+    def get(self, job_id):
+        """Return a job as a dict (with its unpickled result), or None"""
+        row = self._connection().execute(
+            "SELECT id, owner, query, status, submitted_at, started_at, finished_at, result, chart, figure, error "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list_jobs(self, owner, limit=20):
+        """Return the owner's most recent jobs, newest first"""
+        rows = self._connection().execute(
+            "SELECT id, owner, query, status, submitted_at, started_at, finished_at, result, chart, figure, error "
+            "FROM jobs WHERE owner = ? ORDER BY submitted_at DESC LIMIT ?",
+            (owner, limit),
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def delete(self, job_id, owner):
+        self._connection().execute("DELETE FROM jobs WHERE id = ? AND owner = ?", (job_id, owner))
+
+    def pending_count(self, owner=None):
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)"
+        params = [QUEUED, RUNNING]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        return self._connection().execute(query, params).fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row):
+        job_id, owner, query, status, submitted_at, started_at, finished_at, result, chart, figure, error = row
+        return {
+            "id": job_id,
+            "owner": owner,
+            "query": query,
+            "status": status,
+            "submitted_at": submitted_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "result": pickle.loads(result) if result is not None else None,
+            "chart": chart,
+            "figure": json.loads(figure) if figure is not None else None,
+            "error": error,
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide background job queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                path=os.environ.get("JOBS_PATH", DEFAULT_JOBS_PATH),
+                max_workers=int(os.environ.get("JOB_WORKERS", DEFAULT_MAX_WORKERS)),
+                retention_seconds=float(os.environ.get("JOB_RETENTION", DEFAULT_RETENTION_SECONDS)),
+            )
+        return _queue
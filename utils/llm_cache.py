@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "llm_responses.sqlite")
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache shared by all Streamlit sessions.
+
+    The database runs in WAL mode so several sessions (threads or processes)
+    can read while one writes, which is exactly where PandasAI's DuckDB cache
+    used to lock up.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads, so each
+        # Streamlit script thread gets its own connection to the same file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens, dataset_version=None):
+        """Build a stable cache key from the request parameters"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "dataset_version": dataset_version,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on miss/expiry"""
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._count(hit=False)
+            return None
+
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._count(hit=True)
+        return row[0]
+
+    def set(self, key, response):
+        """Store a response and evict least recently used entries over the limit"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            (key, response, now, now),
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        """Remove all cached responses"""
+        self._connection().execute("DELETE FROM responses")
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        size = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": size,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide response cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                path=os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                ttl_seconds=int(os.environ.get("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            )
+        return _cache
@@ -0,0 +1,87 @@
+import os
+
+DEFAULT_MAX_TURNS = 4
+DEFAULT_TOKEN_BUDGET = 3000
+SUMMARY_ITEM_CHARS = 160
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for Latin scripts)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def count_message_tokens(messages):
+    # A few tokens of overhead per message for the role and separators
+    return sum(estimate_tokens(str(message.get("content", ""))) + 4 for message in messages)
+
+
+class MemoryPolicy:
+    """Keeps the conversation sent with each prompt within a fixed size.
+
+    PandasAI sends the whole conversation memory with every request, so
+    prompts grow with each turn. The policy keeps system messages and the
+    current prompt, the last max_turns exchanges verbatim, condenses older
+    turns into a short summary and finally drops the oldest history until
+    the estimated size fits token_budget.
+    """
+
+    def __init__(self, max_turns=DEFAULT_MAX_TURNS, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_turns=int(os.environ.get("AGENT_MEMORY_TURNS", DEFAULT_MAX_TURNS)),
+            token_budget=int(os.environ.get("AGENT_PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+        )
+
+    @property
+    def memory_size(self):
+        """Number of memory messages PandasAI should keep in its own prompts"""
+        return self.max_turns * 2
+
+    def apply(self, messages):
+        """Return a bounded copy of an OpenAI-style message list"""
+        if len(messages) <= 1:
+            return list(messages)
+
+        system = [m for m in messages[:-1] if m.get("role") == "system"]
+        history = [m for m in messages[:-1] if m.get("role") != "system"]
+        current = messages[-1]
+
+        keep = self.max_turns * 2
+        split = max(0, len(history) - keep)
+        older, recent = history[:split], history[split:]
+
+        summary = self._summarize(older)
+        while True:
+            bounded = system + ([summary] if summary else []) + recent + [current]
+            if count_message_tokens(bounded) <= self.token_budget or not (recent or summary):
+                return bounded
+            # Over budget: fold the oldest verbatim turn into the summary,
+            # and once nothing verbatim is left drop the summary too
+            if recent:
+                older = older + recent[:2]
+                recent = recent[2:]
+                summary = self._summarize(older)
+            else:
+                summary = None
+
+    @staticmethod
+    def _summarize(turns):
+        """Condense older turns into one message listing the earlier questions"""
+        questions = [
+            str(m.get("content", "")).strip().splitlines()[0][:SUMMARY_ITEM_CHARS]
+            for m in turns
+            if m.get("role") == "user" and str(m.get("content", "")).strip()
+        ]
+        if not questions:
+            return None
+        # Only the most recent questions matter for follow-ups
+        questions = questions[-10:]
+        return {
+            "role": "system",
+            "content": "Earlier in this conversation the user asked:\n"
+            + "\n".join(f"- {question}" for question in questions),
+        }
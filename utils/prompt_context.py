@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+
+from utils.data_loader import get_column_info
+from utils.memory_policy import estimate_tokens
+
+try:
+    from pandasai.connectors import PandasConnector
+except ImportError:
+    PandasConnector = None
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
+MAX_LISTED_CATEGORIES = 30
+
+
+def _describe_column(series, info):
+    """One-line description of a column: meaning, dtype and summary statistics"""
+    parts = []
+    if info:
+        parts.append(info["description"])
+    parts.append(f"dtype {series.dtype}")
+
+    nulls = int(series.isna().sum())
+    if nulls:
+        parts.append(f"{nulls} missing")
+
+    kind = info["type"] if info else None
+    if kind == "categorical" or (kind is None and series.dtype == object):
+        values = series.dropna().unique()
+        listed = ", ".join(map(str, values[:MAX_LISTED_CATEGORIES]))
+        more = f" (+{len(values) - MAX_LISTED_CATEGORIES} more)" if len(values) > MAX_LISTED_CATEGORIES else ""
+        parts.append(f"{len(values)} values: {listed}{more}")
+    elif pd.api.types.is_numeric_dtype(series) and series.notna().any():
+        if kind == "temporal":
+            parts.append(f"range {series.min()}-{series.max()}")
+        else:
+            stats = series.describe()
+            parts.append(
+                f"min {stats['min']:.4g}, mean {stats['mean']:.4g}, "
+                f"median {stats['50%']:.4g}, max {stats['max']:.4g}, std {stats['std']:.4g}"
+            )
+    return "; ".join(parts)
+
+
+def _stratified_sample(df, max_rows, group_column="Country", time_column="Year"):
+    """A few rows per group, spread evenly over time, at most max_rows in total"""
+    if group_column not in df.columns:
+        return df.sample(n=min(max_rows, len(df)), random_state=0).sort_index()
+
+    groups = list(df[group_column].dropna().unique())
+    if len(groups) > max_rows:
+        # Too many groups for one row each: keep an even spread of them
+        step = len(groups) / max_rows
+        groups = [groups[int(i * step)] for i in range(max_rows)]
+    per_group = max(1, max_rows // max(1, len(groups)))
+
+    rows = []
+    selected = df[df[group_column].isin(groups)]
+    for _, group_df in selected.groupby(group_column, sort=False, observed=True):
+        if time_column in group_df.columns:
+            group_df = group_df.sort_values(time_column)
+        if len(group_df) > per_group:
+            positions = [round(i * (len(group_df) - 1) / max(1, per_group - 1)) for i in range(per_group)]
+            group_df = group_df.iloc[sorted(set(positions))]
+        rows.append(group_df)
+    if not rows:
+        return df.head(0)
+
+    # Interleave groups so the first sample rows (all PandasAI shows per
+    # column) already cover different countries
+    sample = pd.concat(rows)
+    order = sample.groupby(group_column, sort=False, observed=True).cumcount()
+    return sample.iloc[order.argsort(kind="stable")]
+
+
+def build_prompt_context(df, token_budget=None):
+    """Build what PandasAI sends to the LLM about df within a token budget.
+
+    Returns (field_descriptions, sample): a per-column description with
+    dtype and summary statistics, and a small sample stratified by country.
+    The size depends on the number of columns and countries, not rows.
+    """
+    if token_budget is None:
+        token_budget = int(os.environ.get("PROMPT_CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET))
+
+    column_info = get_column_info()
+    field_descriptions = {
+        col: _describe_column(df[col], column_info.get(col)) for col in df.columns
+    }
+
+    schema_tokens = sum(estimate_tokens(f"{col}: {text}") for col, text in field_descriptions.items())
+    row_tokens = estimate_tokens(df.head(1).to_csv(index=False)) if len(df) else 1
+    max_rows = max(1, (token_budget - schema_tokens) // max(1, row_tokens))
+
+    sample = _stratified_sample(df, max_rows).reset_index(drop=True)
+    return field_descriptions, sample
+
+
+def build_dataframe_connector(df, token_budget=None):
+    """Wrap df so prompts carry the compact context instead of raw head rows"""
+    if PandasConnector is None:
+        return df
+    field_descriptions, sample = build_prompt_context(df, token_budget)
+    return PandasConnector(
+        {"original_df": df},
+        custom_head=sample,
+        field_descriptions=field_descriptions,
+    )
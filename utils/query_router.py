@@ -0,0 +1,364 @@
+import re
+
+import pandas as pd
+
+from utils.code_cache import normalize_question
+from utils.data_loader import get_column_info
+
+# Extra names people use for each indicator, besides the column name and
+# its Romanian label from get_column_info(); all without diacritics
+INDICATOR_ALIASES = {
+    "GDP": ["gdp", "pib", "pib-ul", "pib-ului", "gdp-ul", "gdp-ului", "produsul intern brut"],
+    "FDI": ["fdi", "foreign direct investment", "investitii straine", "investitiile straine"],
+    "IU": ["iu", "internet users", "internet usage", "utilizatorii de internet",
+           "utilizatori de internet", "utilizatori internet"],
+    "MCS": ["mcs", "mobile cellular subscriptions", "mobile subscriptions",
+            "subscriptiilor mobile", "subscriptii mobile", "subscriptiile mobile",
+            "abonamente mobile"],
+    "PA": ["pa", "patent applications", "patente", "brevete", "cereri de brevet"],
+    "EF": ["ef", "economic freedom index", "economic freedom", "libertate economica",
+           "libertatii economice"],
+}
+
+COUNTRY_ALIASES = {
+    "Romania": ["romania", "romaniei"],
+    "Bulgaria": ["bulgaria", "bulgariei"],
+    "Turkey": ["turkey", "turcia", "turciei"],
+    "Greece": ["greece", "grecia", "greciei"],
+}
+
+# Words that only frame a question ("care este", "show me the", ...). The
+# router parses by whitelist: every word of a question must be one of these
+# or part of a phrase the grammar below understands, else it goes to the LLM
+STOPWORDS = {
+    # Romanian
+    "care", "este", "sunt", "e", "a", "al", "ale", "ai", "lui", "la", "de", "din", "in", "pentru",
+    "si", "cu", "cat", "cata", "cate", "ce", "un", "o", "pe", "arata", "arata-mi", "spune",
+    "spune-mi", "da-mi", "calculeaza", "afiseaza", "gaseste", "creeaza", "avem", "are", "au",
+    "valoarea", "valoare", "valorile", "tara", "tarile", "tarilor", "tari", "intre", "bazat",
+    "perioada", "toata", "toate", "intreaga", "datele", "anul", "an", "ani", "anii", "fost",
+    # English
+    "what", "which", "is", "was", "were", "the", "an", "of", "for", "and",
+    "between", "me", "show", "give", "tell", "calculate", "compute", "find", "value", "values",
+    "country", "countries", "year", "years", "has", "have", "had", "with", "whole", "entire",
+    "period", "data", "dataset", "overall", "all", "vs", "versus",
+}
+
+# "... și în ce an a fost atinsă?": max/min answers name the year anyway
+WHEN_PATTERNS = [
+    r"(?:si\s+)?in\s+ce\s+an(?:\s+a\s+fost\s+(?:atinsa|atins|inregistrata|inregistrat))?",
+    r"(?:and\s+)?(?:in\s+)?which\s+year(?:\s+(?:was\s+it|it\s+was)\s+(?:reached|recorded))?",
+    r"(?:and\s+)?when(?:\s+(?:was\s+it|it\s+was)\s+(?:reached|recorded))?",
+]
+COUNT_PATTERN = r"(?:cate|how\s+many)\s+(?:inregistrari|randuri|records|rows)"
+RANKING_PATTERN = r"\b(?:ranking|ranking-ul|clasament|clasamentul|rank)\b"
+TOP_PATTERN = r"\btop\s+(\d+)\b"
+DIFFERENCE_PATTERN = r"\b(?:diferenta|difference|difera)\b"
+COMPARE_PATTERN = r"\b(?:compara|compare)\b"
+
+AGGREGATIONS = [
+    # Order matters: "mediana" must be checked before "media"
+    ("median", ["mediana", "median"], "Mediana"),
+    ("mean", ["media", "medie", "mediu", "average", "mean"], "Media"),
+    ("sum", ["suma", "sum", "total"], "Suma"),
+    ("max", ["valoarea maxima", "maxim", "maximum", "max"], "Maximul"),
+    ("min", ["valoarea minima", "minim", "minimum", "min"], "Minimul"),
+]
+
+HIGHEST_TERMS = ["cel mai mare", "cea mai mare", "cele mai mari", "highest", "largest", "biggest"]
+LOWEST_TERMS = ["cel mai mic", "cea mai mica", "cele mai mici", "lowest", "smallest"]
+ALL_COUNTRIES_TERMS = ["toate tarile", "fiecare tara", "all countries", "each country", "intre tari"]
+
+
+def _find_positions(text, aliases):
+    """Return {name: first position} for every name with an alias in text"""
+    found = {}
+    for name, names in aliases.items():
+        for alias in names:
+            match = re.search(rf"(?<![\w-]){re.escape(alias)}(?![\w-])", text)
+            if match and (name not in found or match.start() < found[name]):
+                found[name] = match.start()
+    return [name for name, _ in sorted(found.items(), key=lambda item: item[1])]
+
+
+def _indicator_aliases():
+    aliases = {}
+    for col, info in get_column_info().items():
+        if info["type"] != "numeric":
+            continue
+        names = set(INDICATOR_ALIASES.get(col, []))
+        names.add(col.lower())
+        names.add(normalize_question(info["ro"]))
+        aliases[col] = sorted(names, key=len, reverse=True)
+    return aliases
+
+
+def _parse_years(text, df):
+    """Return (start, end) year bounds mentioned in the question (or None)
+    and the question without the words they were read from"""
+    min_year, max_year = int(df["Year"].min()), int(df["Year"].max())
+
+    def found(match, years):
+        return years, text[:match.start()] + " " + text[match.end():]
+
+    match = re.search(r"(?:intre|between|din|from)\s+(\d{4})\s+(?:si|and|pana in|to)\s+(\d{4})", text)
+    if match is None:
+        match = re.search(r"\b(\d{4})\s*-\s*(\d{4})\b", text)
+    if match:
+        return found(match, tuple(sorted((int(match.group(1)), int(match.group(2))))))
+
+    match = re.search(r"(?:ultimii|last)\s+(\d+)\s+(?:de\s+)?(?:ani|years)", text)
+    if match:
+        return found(match, (max_year - int(match.group(1)) + 1, max_year))
+
+    match = re.search(r"(?:dupa|after|since|incepand cu)\s+(\d{4})", text)
+    if match:
+        year = int(match.group(1))
+        start = year if "incepand" in match.group(0) or "since" in match.group(0) else year + 1
+        return found(match, (start, max_year))
+
+    match = re.search(r"(?:inainte de|before)\s+(\d{4})", text)
+    if match:
+        return found(match, (min_year, int(match.group(1)) - 1))
+
+    match = re.search(r"\b(?:in|pentru|for)\s+(?:anul\s+)?(\d{4})\b", text)
+    if match:
+        year = int(match.group(1))
+        return found(match, (year, year))
+
+    return None, text
+
+
+def _consume(text, pattern):
+    """Return (first match of pattern, text with that match blanked out)"""
+    match = re.search(pattern, text)
+    if match is None:
+        return None, text
+    return match, text[:match.start()] + " " + text[match.end():]
+
+
+def _consume_all(text, phrases):
+    """Blank out every whole-word occurrence of phrases; returns (found?, text)"""
+    found = False
+    for phrase in sorted(phrases, key=len, reverse=True):
+        pattern = rf"(?<![\w-]){re.escape(phrase)}(?![\w-])"
+        if re.search(pattern, text):
+            found = True
+            text = re.sub(pattern, " ", text)
+    return found, text
+
+
+def _consume_names(text, aliases):
+    """Names with an alias in text, in order of appearance, and the text without them"""
+    names = _find_positions(text, aliases)
+    _, text = _consume_all(text, [alias for name in names for alias in aliases[name]])
+    return names, text
+
+
+def _format_number(value):
+    if pd.isna(value):
+        return "n/a"
+    return f"{value:,.2f}"
+
+
+def _describe_period(years):
+    if years is None:
+        return "în toată perioada"
+    if years[0] == years[1]:
+        return f"în {years[0]}"
+    return f"între {years[0]} și {years[1]}"
+
+
+def parse_query(question, df):
+    """Parse a template question into an intent dict, or None if not recognised.
+
+    A wrong answer is worse than an LLM call, so parsing is by whitelist:
+    each word must be read by one of the grammar elements (indicator,
+    country, period, operation) or be a STOPWORDS word. Any other word
+    ("primii", "even", "divided", "euros", ...) may change the question's
+    meaning in ways the templates can't express, and returns None.
+    """
+    text = normalize_question(question)
+    years, rest = _parse_years(text, df)
+    count, rest = _consume(rest, COUNT_PATTERN)
+    indicators, rest = _consume_names(rest, _indicator_aliases())
+    countries, rest = _consume_names(rest, COUNTRY_ALIASES)
+    all_countries, rest = _consume_all(rest, ALL_COUNTRIES_TERMS)
+    ranking, rest = _consume(rest, RANKING_PATTERN)
+    top, rest = _consume(rest, TOP_PATTERN)
+    highest, rest = _consume_all(rest, HIGHEST_TERMS)
+    lowest, rest = _consume_all(rest, LOWEST_TERMS)
+    difference, rest = _consume(rest, DIFFERENCE_PATTERN)
+    compare, rest = _consume(rest, COMPARE_PATTERN)
+    ops = []
+    for op, terms, label in AGGREGATIONS:
+        found, rest = _consume_all(rest, terms)
+        if found:
+            ops.append((op, label))
+    for pattern in WHEN_PATTERNS:
+        _, rest = _consume(rest, rf"\b{pattern}\b")
+
+    if any(word not in STOPWORDS for word in re.findall(r"[\w-]+", rest)):
+        return None
+    # A named country the data doesn't have must not become "all countries"
+    if any(country not in set(df["Country"]) for country in countries):
+        return None
+
+    intent = {
+        "indicators": indicators,
+        "countries": countries,
+        "years": years,
+        "all_countries": all_countries,
+    }
+
+    if count:
+        if indicators or ops:
+            return None
+        intent["op"] = "count"
+        return intent
+
+    if len(indicators) != 1:
+        return None
+    intent["indicator"] = indicators[0]
+    # Other templates only ever average over the years; any other aggregate
+    # next to them would be ignored
+    extra_ops = [op for op, _ in ops if op != "mean"]
+
+    if ranking:
+        if extra_ops or top or highest or lowest:
+            return None
+        intent["op"] = "rank"
+        intent["by"] = "Country"
+        intent["ascending"] = False
+        intent["n"] = df["Country"].nunique()
+        return intent
+
+    if top or highest or lowest:
+        if extra_ops or (highest and lowest) or difference or compare:
+            return None
+        intent["op"] = "rank"
+        intent["ascending"] = bool(lowest)
+        intent["n"] = int(top.group(1)) if top else 1
+        asks_country = re.search(r"\b(?:care tara|ce tara|which country|tari|tarile|countries)\b", text)
+        asks_years = re.search(r"\b(?:ani|anii|years|an|anul|year)\b", text)
+        if asks_country and not countries:
+            intent["by"] = "Country"
+        elif asks_years or countries:
+            intent["by"] = "Year"
+        else:
+            return None
+        return intent
+
+    if difference:
+        if len(countries) != 2 or extra_ops or compare:
+            return None
+        intent["op"] = "difference"
+        return intent
+
+    if compare:
+        if extra_ops:
+            return None
+        intent["op"] = "compare"
+        return intent
+
+    if len(ops) == 1:
+        intent["op"], intent["label"] = ops[0]
+        return intent
+
+    return None
+
+
+def _select(df, intent, use_countries=True):
+    """Select the rows an intent refers to with vectorized masks"""
+    mask = pd.Series(True, index=df.index)
+    if use_countries and intent["countries"]:
+        mask &= df["Country"].isin(intent["countries"])
+    if intent["years"] is not None:
+        mask &= df["Year"].between(intent["years"][0], intent["years"][1])
+    return df[mask]
+
+
+def _answer(intent, df):
+    op = intent["op"]
+    period = _describe_period(intent["years"])
+
+    if op == "count":
+        data = _select(df, intent)
+        counts = data.groupby("Country", observed=True).size()
+        return counts.rename("Număr înregistrări").to_frame()
+
+    indicator = intent["indicator"]
+    data = _select(df, intent).dropna(subset=[indicator])
+    if data.empty:
+        return None
+
+    if op == "rank":
+        if intent["by"] == "Country":
+            if intent["years"] is None or intent["years"][0] != intent["years"][1]:
+                values = data.groupby("Country", observed=True)[indicator].mean()
+            else:
+                values = data.set_index("Country")[indicator]
+            ranked = values.sort_values(ascending=intent["ascending"]).head(intent["n"])
+            if intent["n"] == 1:
+                direction = "cea mai mică" if intent["ascending"] else "cea mai mare"
+                return (
+                    f"Țara cu {direction} valoare {indicator} {period} este "
+                    f"{ranked.index[0]} ({_format_number(ranked.iloc[0])})."
+                )
+            return ranked.rename(indicator).to_frame()
+
+        ranked = data.sort_values(indicator, ascending=intent["ascending"])
+        if intent["countries"] or not intent["all_countries"]:
+            ranked = ranked.head(intent["n"])
+        else:
+            ranked = ranked.groupby("Country", group_keys=False, observed=True).head(intent["n"])
+        return ranked[["Country", "Year", indicator]].reset_index(drop=True)
+
+    if op == "difference":
+        first, second = intent["countries"]
+        values = data.groupby("Country", observed=True)[indicator].mean()
+        if first not in values or second not in values:
+            return None
+        diff = values[first] - values[second]
+        return (
+            f"Diferența {indicator} dintre {first} ({_format_number(values[first])}) și "
+            f"{second} ({_format_number(values[second])}) {period} este {_format_number(diff)}."
+        )
+
+    if op == "compare":
+        single_year = intent["years"] is not None and intent["years"][0] == intent["years"][1]
+        if single_year:
+            return data.set_index("Country")[[indicator]].sort_values(indicator, ascending=False)
+        return (
+            data.groupby("Country", observed=True)[indicator]
+            .agg(["mean", "min", "max"])
+            .rename(columns={"mean": "Media", "min": "Minim", "max": "Maxim"})
+            .sort_values("Media", ascending=False)
+        )
+
+    label = intent["label"]
+    if intent["all_countries"] or len(intent["countries"]) > 1:
+        return data.groupby("Country", observed=True)[indicator].agg(op).rename(f"{label} {indicator}").to_frame()
+
+    value = data[indicator].agg(op)
+    scope = f" pentru {intent['countries'][0]}" if intent["countries"] else ""
+    answer = f"{label} {indicator}{scope} {period} este {_format_number(value)}"
+    if op in ("max", "min"):
+        row = data.loc[data[indicator].idxmax() if op == "max" else data[indicator].idxmin()]
+        answer += f" ({row['Country']}, {int(row['Year'])})"
+    return answer + "."
+
+
+def route_query(question, df):
+    """Answer simple template questions directly with pandas.
+
+    Returns None when the question is not recognised, in which case the
+    caller should fall back to the LLM.
+    """
+    intent = parse_query(question, df)
+    if intent is None:
+        return None
+    try:
+        return _answer(intent, df)
+    except (KeyError, ValueError, IndexError):
+        return None
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+
+import openai
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """Per-model circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    to that model are skipped for reset_timeout seconds. After that a single
+    trial call is let through (half-open); its outcome closes or re-opens
+    the circuit. A trial that ends without either outcome (deadline,
+    interruption) is handed back with release_trial().
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._trial_owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_progress:
+                self._trial_in_progress = True
+                self._trial_owner = threading.get_ident()
+                return True
+            return False
+
+    def release_trial(self):
+        """Give back a half-open trial taken by this thread without recording an outcome"""
+        with self._lock:
+            if self._trial_in_progress and self._trial_owner == threading.get_ident():
+                self._trial_in_progress = False
+                self._trial_owner = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model):
+    """Return the process-wide circuit breaker for a model"""
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+
+def is_retryable(error):
+    """Return True for errors worth retrying or failing over on"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error):
+    """Return the server-requested delay from a Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies (in seconds) for one model"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) > self.window:
+                del self._samples[0]
+
+    def percentile(self, pct, min_samples=10):
+        """Return the pct-th percentile, or None until enough samples exist"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+_latency_trackers = {}
+_ttft_trackers = {}
+
+
+def get_latency_tracker(model):
+    """Return the process-wide tracker of a model's full completion times"""
+    with _breakers_lock:
+        if model not in _latency_trackers:
+            _latency_trackers[model] = LatencyTracker()
+        return _latency_trackers[model]
+
+
+def get_ttft_tracker(model):
+    """Return the process-wide tracker of a model's time to first streamed token"""
+    with _breakers_lock:
+        if model not in _ttft_trackers:
+            _ttft_trackers[model] = LatencyTracker()
+        return _ttft_trackers[model]
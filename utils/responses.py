@@ -0,0 +1,81 @@
+import base64
+
+import plotly.graph_objects as go
+
+from utils.chart_renderer import get_chart_renderer
+from utils.data_loader import get_country_colors
+
+try:
+    from pandasai.responses.response_parser import ResponseParser
+except ImportError:
+    ResponseParser = object
+
+PNG_DATA_URI_PREFIX = "data:image/png;base64,"
+
+
+class QueryResponse:
+    """The answer to one query: its value plus the chart it drew, if any.
+
+    Charts are captured in memory by the code executor and travel with the
+    response, so pages never read them back from a shared file on disk.
+    """
+
+    def __init__(self, value, chart=None, figure=None):
+        self.value = value
+        self.chart = chart
+        # Plotly figure spec (a JSON-compatible dict), rendered client-side
+        self.figure = figure
+
+    @classmethod
+    def from_result(cls, result):
+        """Build a response from a PandasAI result dict"""
+        chart = result.get("chart")
+        figure = None
+        value = result["value"]
+        if result.get("type") == "plot":
+            if isinstance(value, dict):
+                figure = value
+            elif chart is None and isinstance(value, str) and value.startswith(PNG_DATA_URI_PREFIX):
+                chart = base64.b64decode(value[len(PNG_DATA_URI_PREFIX):])
+            # The chart is the answer; don't show its spec or data URI as text
+            value = None
+        return cls(value, chart, figure)
+
+    def __repr__(self):
+        return (
+            f"QueryResponse(value={self.value!r}, chart={len(self.chart) if self.chart else 0} bytes, "
+            f"figure={self.figure is not None})"
+        )
+
+
+def to_plotly_figure(spec):
+    """Build a plotly figure from a spec, using the app's colour for each country"""
+    figure = go.Figure(spec)
+    colors = get_country_colors()
+    for trace in figure.data:
+        color = colors.get(getattr(trace, "name", None))
+        if color is None:
+            continue
+        if "marker" in trace:
+            trace.update(marker_color=color)
+        if "line" in trace:
+            trace.update(line_color=color)
+    return figure
+
+
+def figure_png(spec, wait=False):
+    """PNG export of a figure spec, rendered off-thread.
+
+    None while it is still rendering, and empty bytes (falsy) when the
+    figure can't be exported.
+    """
+    return get_chart_renderer().render(spec, colors=get_country_colors(), wait=wait)
+
+
+class ChartResponseParser(ResponseParser):
+    """PandasAI response parser that returns QueryResponse objects"""
+
+    def parse(self, result):
+        if not isinstance(result, dict) or any(key not in result for key in ["type", "value"]):
+            raise ValueError("Unsupported result format")
+        return QueryResponse.from_result(result)
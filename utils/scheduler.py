@@ -0,0 +1,262 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+DEFAULT_MAX_CONCURRENCY = 8
+# OpenRouter's free tier allows about 20 requests per minute per key
+DEFAULT_KEY_RATE_PER_MINUTE = 20.0
+DEFAULT_KEY_BURST = 5
+WAIT_HISTORY_SIZE = 500
+
+_local = threading.local()
+
+
+class QueueTimeout(TimeoutError):
+    """A call waited longer than its timeout for a scheduler slot"""
+
+
+class QueueCancelled(Exception):
+    """A call was cancelled while it was still waiting for a scheduler slot"""
+
+
+def get_session_id():
+    """The session the current thread works for (see scheduled_as)"""
+    session_id = getattr(_local, "session_id", None)
+    if session_id is not None:
+        return session_id
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+
+def get_session_weight():
+    """The fair-queuing weight set by scheduled_as for this thread, or None"""
+    return getattr(_local, "weight", None)
+
+
+@contextmanager
+def scheduled_as(session_id, weight=None):
+    """Attribute LLM calls made by this thread to session_id.
+
+    Worker threads (batch runs, background jobs) have no Streamlit context,
+    so they use this to keep counting against the session that started them.
+    """
+    previous = getattr(_local, "session_id", None), getattr(_local, "weight", None)
+    _local.session_id = session_id
+    _local.weight = weight
+    try:
+        yield
+    finally:
+        _local.session_id, _local.weight = previous
+
+
+class _TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class _Waiter:
+    def __init__(self, session_id, key_id, start_tag, finish_tag, seq, cancelled=None):
+        self.session_id = session_id
+        self.key_id = key_id
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.cancelled = cancelled
+
+    def is_cancelled(self):
+        return self.cancelled is not None and self.cancelled.is_set()
+
+
+class FairScheduler:
+    """Admission control for upstream LLM calls.
+
+    At most max_concurrency calls run at once; each API key may start
+    rate_per_minute calls per minute (bursts up to burst); and waiting calls
+    are admitted by weighted fair queuing between sessions, so a session
+    firing many requests gets its share instead of everyone else's.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 rate_per_minute=DEFAULT_KEY_RATE_PER_MINUTE, burst=DEFAULT_KEY_BURST):
+        self.max_concurrency = max_concurrency
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._running = 0
+        self._buckets = {}
+        # Weighted fair queuing: virtual time and each session's last finish tag
+        self._virtual_time = 0.0
+        self._finish_tags = {}
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=WAIT_HISTORY_SIZE)
+
+    def _bucket(self, key_id):
+        bucket = self._buckets.get(key_id)
+        if bucket is None:
+            bucket = _TokenBucket(self.rate, self.burst)
+            self._buckets[key_id] = bucket
+        return bucket
+
+    def _dispatch(self, now):
+        """Admit waiters in finish-tag order while slots and key tokens allow.
+
+        Returns how long to wait for the next token refill when a waiter is
+        only blocked by its key's rate limit, else None.
+        """
+        next_refill = None
+        for waiter in sorted(self._waiters, key=lambda w: (w.finish_tag, w.seq)):
+            if self._running >= self.max_concurrency:
+                break
+            if waiter.is_cancelled():
+                # Its own thread removes it; it must not spend a key token
+                continue
+            bucket = self._bucket(waiter.key_id)
+            if not bucket.available(now):
+                # This key is rate limited; let other keys use the free slot
+                wait = bucket.wait_time(now)
+                next_refill = wait if next_refill is None else min(next_refill, wait)
+                continue
+            bucket.take()
+            waiter.granted = True
+            self._waiters.remove(waiter)
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            self._waits.append(now - waiter.enqueued)
+        return next_refill
+
+    def acquire(self, key_id, session_id=None, weight=None, timeout=None, cancelled=None):
+        """Block until the call may start.
+
+        Raises QueueTimeout after timeout seconds, or QueueCancelled once the
+        cancelled event is set (see wake()) while the call is still queued.
+        """
+        session_id = session_id or get_session_id()
+        weight = weight or get_session_weight() or 1.0
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            start_tag = max(self._virtual_time, self._finish_tags.get(session_id, 0.0))
+            finish_tag = start_tag + 1.0 / weight
+            self._finish_tags[session_id] = finish_tag
+            waiter = _Waiter(session_id, key_id, start_tag, finish_tag, next(self._seq), cancelled)
+            self._waiters.append(waiter)
+
+            while True:
+                if waiter.is_cancelled():
+                    self._waiters.remove(waiter)
+                    self._prune_finish_tags()
+                    self._cond.notify_all()
+                    raise QueueCancelled("Cererea a fost anulată înainte de a porni.")
+                next_refill = self._dispatch(time.monotonic())
+                if waiter.granted:
+                    self._cond.notify_all()
+                    return
+                wait = next_refill
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiters.remove(waiter)
+                        raise QueueTimeout("Prea multe cereri în așteptare; încearcă din nou în câteva momente.")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def wake(self):
+        """Let waiting calls re-check their cancelled events"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._running -= 1
+            self._prune_finish_tags()
+            self._cond.notify_all()
+
+    def _prune_finish_tags(self):
+        if not self._waiters:
+            # Nothing queued ends the busy period: every session starts level again
+            self._virtual_time = max([self._virtual_time, *self._finish_tags.values()])
+            self._finish_tags.clear()
+            return
+        # A session whose last finish tag the virtual time has passed would
+        # start at the virtual time anyway, so its entry can go
+        waiting = {waiter.session_id for waiter in self._waiters}
+        for session_id, finish_tag in list(self._finish_tags.items()):
+            if finish_tag <= self._virtual_time and session_id not in waiting:
+                del self._finish_tags[session_id]
+
+    @contextmanager
+    def slot(self, key_id, session_id=None, weight=None, timeout=None, cancelled=None):
+        """Hold a scheduler slot for the duration of one upstream call.
+
+        Take it for each attempt separately and never across a retry delay:
+        every attempt uses one of the key's rate-limit tokens.
+        """
+        self.acquire(key_id, session_id=session_id, weight=weight, timeout=timeout, cancelled=cancelled)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            now = time.monotonic()
+            by_session = {}
+            for waiter in self._waiters:
+                by_session[waiter.session_id] = by_session.get(waiter.session_id, 0) + 1
+            return {
+                "running": self._running,
+                "queue_depth": len(self._waiters),
+                "queued_by_session": by_session,
+                "oldest_wait": max((now - w.enqueued for w in self._waiters), default=0.0),
+                "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            }
+
+
+def key_id_for(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide LLM call scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                rate_per_minute=float(os.environ.get("LLM_KEY_RATE_PER_MINUTE", DEFAULT_KEY_RATE_PER_MINUTE)),
+                burst=int(os.environ.get("LLM_KEY_BURST", DEFAULT_KEY_BURST)),
+            )
+        return _scheduler
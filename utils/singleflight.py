@@ -0,0 +1,75 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when the leader was interrupted (e.g. by a Streamlit rerun)
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is still running wait for it and share its result (or
+    its exception) instead of issuing their own request. Only ordinary
+    exceptions are shared: if the leader is interrupted by a BaseException
+    (such as a Streamlit rerun of its own session), a waiting caller takes
+    over and runs the function itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn once per in-flight key; return (result, shared)"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            call.done.wait()
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        """Return the number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+
+_inflight = SingleFlight()
+
+
+def get_inflight_registry():
+    """Return the process-wide registry shared by all OpenRouterLLM instances"""
+    return _inflight